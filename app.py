@@ -1,13 +1,28 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from verkx_code import main_forecast, main_opperational_forecast, calculate_offer, generate_offer_pdf
-import requests
+from verkx_code import main_forecast, main_opperational_forecast, simulate_operational_forecast, plot_distribution, calculate_offer, calculate_offers_bulk, generate_offer_pdf, generate_offer_pdfs, get_forecast_cube
+from verkx_fx import get_exchange_rate_provider
+import verkx_diag as diag
+from verkx_export import XLSX_MIME, report_sheets, xlsx_file
+from verkx_store import get_result_store
+from verkx_delivery import get_delivery_index
+from contextlib import ExitStack
 from datetime import date
 from io import BytesIO
 
 st.set_page_config(page_title="Cubit", page_icon="cubitlogo.png", layout="wide")
 
+# Sama spá með sömu gögnum og sama seed er sótt úr niðurstöðugeymslunni (.cache/results) í stað þess að reikna aftur
+FORECAST_SEED = 0
+result_store = get_result_store()
+# Hermun sem stöðvaðist á time_budget veltur á hraða vélarinnar og er ekki geymd
+main_forecast = result_store.cached(
+    main_forecast, skip=lambda a: a["seed"] is None,
+    keep=lambda result: all(s.get("convergence", {}).get("reason") != "time_budget" for s in result[1]))
+main_opperational_forecast = result_store.cached(main_opperational_forecast)
+simulate_operational_forecast = result_store.cached(simulate_operational_forecast, skip=lambda a: a["seed"] is None)
+
 # --- Sidebar ---
 with st.sidebar:
     language = st.selectbox("Language", ["Íslenska", "English"], index=0)
@@ -16,6 +31,21 @@ with st.sidebar:
         ["Eftirspurnarspá", "Tilboðsreiknivél", "Rekstrarspá"] if language == "Íslenska"
         else ["Demand Forecast", "Quotation Calculator", "Operational Forecast"]
     )
+    diagnostics_on = st.checkbox("Greining" if language == "Íslenska" else "Diagnostics", value=diag.DIAGNOSTICS.enabled)
+    # Gildir aðeins fyrir þessa lotu; VERKX_DIAGNOSTICS ræður sjálfgefnu gildi. Mælingarnar safnast líka
+    # í safnara lotunnar svo spjaldið sýni ekki tíma annarra lotna
+    diag.enable_local(diagnostics_on)
+    diag.use_local(st.session_state.setdefault("diag_store", diag.DiagnosticsStore()))
+    profile_clicked = diagnostics_on and st.button("cProfile næstu keyrslu" if language == "Íslenska" else "cProfile next run")
+
+# cProfile nær yfir eina heila keyrslu síðunnar, þá næstu eftir að ýtt var á hnappinn
+profile_stack = ExitStack()
+profile_result = None
+if diagnostics_on and st.session_state.get("profile_armed") and not profile_clicked:
+    st.session_state["profile_armed"] = False
+    profile_result = profile_stack.enter_context(diag.profile())
+if profile_clicked:
+    st.session_state["profile_armed"] = True
 
 labels = {
     "Íslenska": {
@@ -60,6 +90,9 @@ labels = {
 if ("Eftirspurnarspá" in page and language == "Íslenska") or ("Demand Forecast" in page and language == "English"):
     st.title(labels[language]['title'])
 
+    # Spáteningurinn er byggður þegar síðan opnast svo "Keyra spá" þarf aðeins uppflettingu
+    get_forecast_cube()
+
     housing_map = {
         "Íslenska": ["Íbúðir", "Leikskólar", "Gistirými", "Elliheimili", "Atvinnuhús"],
         "English": ["Apartments", "Kindergartens", "Accommodation facilities", "Nursing homes", "Commercial buildings"]
@@ -92,10 +125,28 @@ if ("Eftirspurnarspá" in page and language == "Íslenska") or ("Demand Forecast
     with col4:
         market_share = st.slider(labels[language]["market"], 0, 100, 50) / 100
 
+    # Hermunum er hætt þegar öryggisbil meðaltals og P5/P50/P95 eru innan valinnar nákvæmni
+    tolerance = st.select_slider(
+        "Nákvæmni hermunar" if language == "Íslenska" else "Simulation precision",
+        options=[0.05, 0.02, 0.01, 0.005, 0.002],
+        value=0.01,
+        format_func=lambda t: f"±{t * 100:g}%"
+    )
+    sampling_labels = {
+        "iid": "Óháð (iid)" if language == "Íslenska" else "Independent (iid)",
+        "antithetic": "Andhverf pör" if language == "Íslenska" else "Antithetic",
+        "lhs": "Latin hypercube",
+        "sobol": "Sobol",
+    }
+    sampling = st.selectbox(
+        "Úrtaksaðferð" if language == "Íslenska" else "Sampling method",
+        list(sampling_labels), index=2, format_func=sampling_labels.get
+    )
+
     if st.button(labels[language]["run"]):
         with st.spinner(labels[language]["loading"]):
             try:
-                df, figures, used_years = main_forecast(housing_type, region, future_years, market_share)
+                df, summaries, used_years = main_forecast(housing_type, region, future_years, market_share, seed=FORECAST_SEED, tolerance=tolerance, time_budget=2.0, sampling=sampling)
 
                 if used_years < future_years:
                     st.warning(labels[language]["warning"].format(used_years))
@@ -113,12 +164,15 @@ if ("Eftirspurnarspá" in page and language == "Íslenska") or ("Demand Forecast
                     st.dataframe(df.set_index(df.columns[0]))
 
                     st.subheader(labels[language]["distribution"])
-                    for fig in figures:
-                        st.pyplot(fig)
+                    for summary in summaries:
+                        st.image(plot_distribution(summary))
+                        st.caption(" · ".join(f"{q}: {v:,.1f}" for q, v in summary["quantiles"].items())
+                                   + f" · n = {summary['simulations']:,}")
 
                 with tabs[1]:
-                    csv = df.to_csv(index=False).encode("utf-8-sig")
-                    st.download_button(labels[language]["download_button"], csv, labels[language]["download_name"], "text/csv")
+                    # Skrár eru aðeins búnar til þegar smellt er á hnappinn
+                    st.download_button(labels[language]["download_button"], lambda: df.to_csv(index=False).encode("utf-8-sig"),
+                                       labels[language]["download_name"], "text/csv", on_click="ignore")
 
             except Exception as e:
                 st.error(f"{labels[language]['error']}: {e}")
@@ -184,40 +238,77 @@ elif "Rekstrarspá" in page or "Operational Forecast" in page:
                     st.dataframe(df_cost_disp)
 
                     st.download_button("Sækja CSV (einingar)" if language == "Íslenska" else "Download CSV (units)",
-                                       df_units_disp.to_csv(index=False).encode("utf-8-sig"),
+                                       lambda: df_units_disp.to_csv(index=False).encode("utf-8-sig"),
                                        file_name="einingar.csv",
-                                       mime="text/csv")
+                                       mime="text/csv",
+                                       on_click="ignore")
 
                     st.download_button("Sækja CSV (kostnaður)" if language == "Íslenska" else "Download CSV (cost)",
-                                       df_cost_disp.to_csv(index=False).encode("utf-8-sig"),
+                                       lambda: df_cost_disp.to_csv(index=False).encode("utf-8-sig"),
                                        file_name="kostnadur.csv",
-                                       mime="text/csv")
+                                       mime="text/csv",
+                                       on_click="ignore")
+
+                    # Ein xlsx skýrsla: einingar, kostnaður, eftirspurnarspá allra landshluta og hlutfallsmörk hermana
+                    st.download_button("Sækja skýrslu (xlsx)" if language == "Íslenska" else "Download report (xlsx)",
+                                       lambda: xlsx_file(report_sheets(operational=(df_units_disp, df_cost_disp))),
+                                       file_name="rekstrarspa.xlsx",
+                                       mime=XLSX_MIME,
+                                       on_click="ignore")
                 else:
                     st.warning("Engin gögn fundust." if language == "Íslenska" else "No data found.")
 
             except Exception as e:
                 st.error(f"Villa við útreikning: {e}" if language == "Íslenska" else f"Error during calculation: {e}")
 
+    with st.expander("Óvissugreining (Monte Carlo)" if language == "Íslenska" else "Uncertainty analysis (Monte Carlo)"):
+        col1, col2, col3 = st.columns(3)
+        op_simulations = col1.number_input("Fjöldi hermana" if language == "Íslenska" else "Simulations", min_value=1000, max_value=500000, value=50000, step=1000)
+        op_volatility = col2.slider("Flökt eftirspurnar (%)" if language == "Íslenska" else "Demand volatility (%)", 0, 100, 10) / 100
+        op_correlation = col3.slider("Fylgni milli landshluta" if language == "Íslenska" else "Correlation between regions", 0.0, 0.95, 0.0)
+        if st.button("Keyra hermun" if language == "Íslenska" else "Run simulation", key="run_operational_simulation"):
+            with st.spinner("Reikna..." if language == "Íslenska" else "Calculating..."):
+                try:
+                    df_sim = simulate_operational_forecast(
+                        past_file="data/GÖGN_VERKX.xlsx",
+                        future_file="data/Framtidarspa.xlsx",
+                        share_file="data/markadshlutdeild.xlsx",
+                        margin_2025=margin_2025,
+                        margin_2026=margin_2026,
+                        margin_2027=margin_2027,
+                        margin_2028=margin_2028,
+                        simulations=int(op_simulations),
+                        volatility=op_volatility,
+                        region_correlation=op_correlation,
+                        seed=FORECAST_SEED
+                    )
+                    if language == "English":
+                        df_sim = df_sim.rename(columns={
+                            'Ár': "Year", 'hagnaður P5': "Profit P5", 'hagnaður P50': "Profit P50",
+                            'hagnaður P95': "Profit P95", 'meðalhagnaður': "Mean profit", 'líkur á tapi': "Probability of loss"
+                        })
+                    st.dataframe(df_sim)
+                except Exception as e:
+                    st.error(f"Villa við útreikning: {e}" if language == "Íslenska" else f"Error during calculation: {e}")
+
 elif "Tilboðsreiknivél" in page or "Quotation Calculator" in page:
     st.title("Tilboðsreiknivél" if language == "Íslenska" else "Quotation Calculator")
 
+    # Afhendingarstaðir og km frá Þorlákshöfn úr data/afhendingarstadir.csv (verkx_delivery)
     afhendingar_map = {
-        "Íslenska": {
-            "Höfuðborgarsvæðið": 60, "Selfoss": 30, "Hveragerði": 40, "Akranes": 100,
-            "Borgarnes": 150, "Stykkishólmur": 260, "Ísafjörður": 570, "Akureyri": 490,
-            "Húsavík": 520, "Sauðárkrókur": 450, "Egilsstaðir": 650, "Seyðisfjörður": 670,
-            "Neskaupstaður": 700, "Eskifjörður": 690, "Fáskrúðsfjörður": 680, "Höfn": 450,
-            "Vestmannaeyjar": 90, "Keflavík": 90, "Annað": None
-        },
-        "English": {
-            "Capital Region": 60, "Selfoss": 30, "Hveragerði": 40, "Akranes": 100,
-            "Borgarnes": 150, "Stykkishólmur": 260, "Ísafjörður": 570, "Akureyri": 490,
-            "Húsavík": 520, "Sauðárkrókur": 450, "Egilsstaðir": 650, "Seyðisfjörður": 670,
-            "Neskaupstaður": 700, "Eskifjörður": 690, "Fáskrúðsfjörður": 680, "Höfn": 450,
-            "Vestmannaeyjar": 90, "Keflavík": 90, "Other": None
-        }
+        lang: dict(get_delivery_index().table(lang), **{"Annað" if lang == "Íslenska" else "Other": None})
+        for lang in ("Íslenska", "English")
     }
 
+    def saekja_gengi():
+        return get_exchange_rate_provider().rate()
+
+    gengi = get_exchange_rate_provider().info()
+    if gengi["age_seconds"] is None:
+        st.caption(f"EUR/ISK: {gengi['rate']:.2f} ({'sjálfgefið gengi' if language == 'Íslenska' else 'default rate'})")
+    else:
+        st.caption(f"EUR/ISK: {gengi['rate']:.2f} ({gengi['source']}, {gengi['age_seconds'] / 60:.0f} min)")
+
     with st.form("tilbod_form"):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -246,16 +337,21 @@ elif "Tilboðsreiknivél" in page or "Quotation Calculator" in page:
 
     if submitted:
         modules = {"3m": modul3, "2m": modul2, "1m": modul1, "0.5m": modul_half}
+        if stadsetning_val in ["Annað", "Other"] and km_fra_thorlakshofn == 0 and stadsetning:
+            # Staður eða póstnúmer sem er í afhendingarstöðum þarf ekki km
+            fundid_km, aaetlad = get_delivery_index().resolve([stadsetning])
+            if not np.isnan(fundid_km[0]):
+                km_fra_thorlakshofn = float(fundid_km[0])
+                if aaetlad[0]:
+                    st.warning(f"Vegalengd til {stadsetning} er áætluð ({km_fra_thorlakshofn:,.0f} km), ekki úr verðskrá."
+                            if language == "Íslenska" else
+                            f"Distance to {stadsetning} is estimated ({km_fra_thorlakshofn:,.0f} km), not from the price list.")
         if all(v == 0 for v in modules.values()):
             st.warning("Vinsamlegast veldu einingar." if language == "Íslenska" else "Please select modules.")
         elif stadsetning_val in ["Annað", "Other"] and km_fra_thorlakshofn == 0:
             st.warning("Vinsamlegast sláðu inn km." if language == "Íslenska" else "Please enter km.")
         else:
-            try:
-                response = requests.get("https://api.frankfurter.app/latest?from=EUR&to=ISK", timeout=5)
-                eur_to_isk = response.json()['rates']['ISK']
-            except:
-                eur_to_isk = 146
+            eur_to_isk = saekja_gengi()
 
             result = calculate_offer(modules, km_fra_thorlakshofn, eur_to_isk)
 
@@ -279,20 +375,93 @@ elif "Tilboðsreiknivél" in page or "Quotation Calculator" in page:
                 from unicodedata import normalize
                 hreinsadur_verkkaupi = normalize('NFKD', verkkaupi).encode('ascii', 'ignore').decode('ascii')
                 hreinsud_stadsetning = normalize('NFKD', stadsetning).encode('ascii', 'ignore').decode('ascii')
-                pdf_bytes = generate_offer_pdf(hreinsadur_verkkaupi, hreinsud_stadsetning, result, language)
+                # PDF skjalið er aðeins búið til þegar smellt er á hnappinn
                 st.download_button(
                     label="Sækja PDF tilboð" if language == "Íslenska" else "Download offer PDF",
-                    data=pdf_bytes,
+                    data=lambda: generate_offer_pdf(hreinsadur_verkkaupi, hreinsud_stadsetning, result, language),
                     file_name=f"tilbod_{hreinsadur_verkkaupi}.pdf",
-                    mime="application/pdf"
+                    mime="application/pdf",
+                    on_click="ignore"
                 )
             except UnicodeEncodeError:
                 st.error("Villa við útgáfu PDF" if language == "Íslenska" else "PDF generation error")
 
-
-
-
-
-
-
-
+    st.markdown("---")
+    with st.expander("Mörg tilboð úr CSV" if language == "Íslenska" else "Bulk offers from CSV"):
+        st.caption(
+            "Dálkar: 3m, 2m, 1m, 0.5m og km, stadsetning (staður eða póstnúmer) eða breidd/lengd. Valfrjálst: verkkaupi, markup, eur_to_isk."
+            if language == "Íslenska" else
+            "Columns: 3m, 2m, 1m, 0.5m and km, stadsetning (town or postcode) or breidd/lengd (lat/lon). Optional: verkkaupi, markup, eur_to_isk."
+        )
+        bulk_file = st.file_uploader("CSV skrá" if language == "Íslenska" else "CSV file", type="csv")
+        if bulk_file is not None:
+            try:
+                df_bulk = pd.read_csv(bulk_file)
+                # Línur án km fá vegalengd eftir stadsetning eða breidd/lengd í calculate_offers_bulk
+                stadir = [c for c in ('stadsetning', 'breidd') if c in df_bulk.columns]
+                if not stadir and ('km' not in df_bulk.columns or df_bulk['km'].isna().any()):
+                    st.warning("Km vantar fyrir sumar línur." if language == "Íslenska" else "Km is missing for some rows.")
+                else:
+                    if 'eur_to_isk' not in df_bulk.columns:
+                        df_bulk['eur_to_isk'] = saekja_gengi()
+                    # Staðir án vegalengdar í verðskrá fá áætlaða km; þær línur eru aðeins verðlagðar ef notandinn leyfir
+                    _, aaetlad = get_delivery_index().frame_resolve(df_bulk)
+                    leyfa_aaetlad = False
+                    if aaetlad.any():
+                        nofn = df_bulk['stadsetning'].astype(str) if 'stadsetning' in df_bulk.columns else pd.Series([''] * len(df_bulk))
+                        linur = ", ".join(f"{i + 1} ({nofn.iloc[i]})" if nofn.iloc[i] not in ('', 'nan') else str(i + 1)
+                                          for i in np.flatnonzero(aaetlad)[:20])
+                        st.warning(f"Vegalengd er áætluð, ekki úr verðskrá, fyrir línur: {linur}. Gefðu km fyrir þær línur."
+                                   if language == "Íslenska" else
+                                   f"Distance is estimated, not from the price list, for rows: {linur}. Please provide km for those rows.")
+                        leyfa_aaetlad = st.checkbox("Reikna samt með áætlaðri vegalengd" if language == "Íslenska"
+                                                    else "Price with the estimated distance anyway")
+                    if leyfa_aaetlad or not aaetlad.any():
+                        df_offers = calculate_offers_bulk(df_bulk, allow_estimated=leyfa_aaetlad)
+                        st.dataframe(df_offers)
+                        # CSV og zip eru aðeins búin til þegar smellt er á hnappana
+                        st.download_button(
+                            "Sækja tilboð (CSV)" if language == "Íslenska" else "Download offers (CSV)",
+                            lambda: df_offers.to_csv(index=False).encode("utf-8-sig"),
+                            file_name="tilbod.csv",
+                            mime="text/csv",
+                            on_click="ignore"
+                        )
+                        st.download_button(
+                            "Sækja PDF tilboð (zip)" if language == "Íslenska" else "Download offer PDFs (zip)",
+                            lambda: generate_offer_pdfs(df_offers, language),
+                            file_name="tilbod.zip",
+                            mime="application/zip",
+                            on_click="ignore"
+                        )
+            except Exception as e:
+                st.error(f"Villa í CSV skrá: {e}" if language == "Íslenska" else f"Error in CSV file: {e}")
+
+profile_stack.close()
+if profile_result is not None:
+    st.session_state["profile_stats"] = (profile_result["seconds"], profile_result["stats"])
+
+if diagnostics_on:
+    with st.sidebar.expander("Greining" if language == "Íslenska" else "Diagnostics", expanded=True):
+        snapshot = diag.snapshot()
+        if snapshot["timers"]:
+            timers = pd.DataFrame.from_dict(snapshot["timers"], orient="index").sort_values("total_s", ascending=False)
+            st.dataframe(timers[["calls", "total_s", "mean_s", "max_s", "last_s"]].style.format("{:.4f}", subset=["total_s", "mean_s", "max_s", "last_s"]))
+        if snapshot["counters"]:
+            st.dataframe(pd.Series(snapshot["counters"], name="count"))
+        store_stats = result_store.stats()
+        # Niðurstöðugeymslan er sameiginleg öllum lotum ferlisins
+        st.caption(("Niðurstöðugeymsla (allar lotur)" if language == "Íslenska" else "Result store (all sessions)")
+                   + f": {store_stats['hits']}/{store_stats['hits'] + store_stats['misses']} ({store_stats['hit_rate']:.0%}) · "
+                   + f"{store_stats['entries']} · {store_stats['bytes'] / 1e6:.1f} MB")
+        if st.session_state.get("profile_armed"):
+            st.caption("cProfile keyrir í næstu keyrslu" if language == "Íslenska" else "cProfile will capture the next run")
+        if "profile_stats" in st.session_state:
+            seconds, stats = st.session_state["profile_stats"]
+            st.caption(f"cProfile: {seconds:.3f} s")
+            st.code(stats)
+        if st.button("Núllstilla" if language == "Íslenska" else "Reset"):
+            diag.reset()
+            st.session_state.pop("profile_stats", None)
+        if st.button("Tæma niðurstöðugeymslu" if language == "Íslenska" else "Clear result store"):
+            result_store.clear()
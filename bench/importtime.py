@@ -0,0 +1,79 @@
+# Mælir ræsitíma (python -X importtime) fyrir verkx_code og athugar að þungir
+# pakkar séu ekki sóttir við import. Skilar villukóða 1 ef farið er yfir mörkin.
+#
+#   python bench/importtime.py --budget-ms 800 --runs 5
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pakkar sem eiga aðeins að hlaðast á þeim leiðum sem nota þá
+LAZY_MODULES = ["matplotlib.pyplot", "sklearn", "fpdf", "requests", "scipy"]
+
+
+def importtime(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def app_toplevel_imports():
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="verkx_code")
+    parser.add_argument("--budget-ms", type=float, default=800.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        rows = importtime(args.module)
+        totals.append(next(c for n, _, c in rows if n == args.module) / 1000)
+    median_ms = statistics.median(totals)
+
+    print(f"{args.module}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print(f"Top {args.top} self times (last run):")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.1f} ms > {args.budget_ms:.0f} ms")
+    loaded = {n for n, _, _ in rows}
+    for lazy in LAZY_MODULES:
+        if lazy in loaded:
+            failures.append(f"{args.module} imports {lazy} at load time")
+        if any(name == lazy or name.startswith(lazy + ".") for name in app_toplevel_imports()):
+            failures.append(f"app.py imports {lazy} at module level")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Ber fit_linear_trends og linear_forecast saman við sklearn LinearRegression á öllum röðum í data/
+# (fortíðargögn og framtíðarspá, hvert húsnæði x landshluti x sviðsmynd). Hallatölur, skurðpunktar og spár
+# fyrir --years ár frá FORECAST_START_YEAR þurfa að vera innan vikmarka; annars hættir skriftan með kóða 1.
+#
+#   python bench/linear_parity.py
+#   python bench/linear_parity.py --rtol 1e-9 --years 30
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+import verkx_code as vk
+
+
+def sklearn_fit(years, values):
+    model = LinearRegression().fit(np.asarray(years, dtype=float).reshape(-1, 1), np.asarray(values, dtype=float))
+    return float(model.coef_[0]), float(model.intercept_), model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--past-file", default=vk.PAST_FILE)
+    parser.add_argument("--future-file", default=vk.FUTURE_FILE)
+    parser.add_argument("--years", type=int, default=vk.CUBE_HORIZON)
+    parser.add_argument("--rtol", type=float, default=1e-8)
+    args = parser.parse_args()
+
+    store = vk.get_demand_store(args.past_file, args.future_file)
+    keys = sorted(store.index)
+    series = [store.index[key] for key in keys]
+    slopes, intercepts = vk.fit_linear_trends(series)
+    future_years = np.arange(vk.FORECAST_START_YEAR, vk.FORECAST_START_YEAR + args.years)
+
+    failures = []
+    worst = 0.0
+    for key, (years, values), slope, intercept in zip(keys, series, slopes, intercepts):
+        ref_slope, ref_intercept, model = sklearn_fit(years, values)
+        ref_pred = model.predict(future_years.astype(float).reshape(-1, 1))
+        _, pred = vk.linear_forecast(pd.DataFrame({'ar': years, 'gildi': values}), 'gildi', vk.FORECAST_START_YEAR, args.years)
+        # Frávik miðað við stærð raðarinnar svo raðir nálægt 0 falli ekki á hlutfallslegri villu
+        scale = max(np.abs(values).max(), np.abs(ref_pred).max(), 1.0)
+        errors = {
+            "slope": abs(slope - ref_slope) / scale,
+            "intercept": abs(intercept - ref_intercept) / (scale * max(abs(future_years[0]), 1)),
+            "linear_forecast": np.abs(pred - ref_pred).max() / scale,
+        }
+        worst = max(worst, *errors.values())
+        bad = [name for name, err in errors.items() if not err <= args.rtol]
+        if bad:
+            failures.append((key, bad, errors))
+
+    print(f"{len(keys)} raðir, {args.years} spáár, mesta hlutfallslega frávik {worst:.3g} (vikmörk {args.rtol:g})")
+    for key, bad, errors in failures:
+        print(f"  MISRÆMI {key}: " + ", ".join(f"{name}={errors[name]:.3g}" for name in bad))
+    if failures:
+        print(f"{len(failures)} af {len(keys)} röðum víkja frá sklearn.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Álagsprófun á verkx_service: samtímis biðlar með viðvarandi tengingar, p50/p99 biðtími og beiðnir á sekúndu.
+# Ræsir þjónustuna sjálf í undirferli nema --url sé gefið.
+#
+#   python bench/loadtest.py --clients 16 --seconds 10
+#   python bench/loadtest.py --url http://127.0.0.1:8765 --endpoints /quote
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUOTE = {"modules": {"3m": 4, "2m": 10, "1m": 2, "0.5m": 1}, "km": 60, "markup": 0.15}
+PDF = dict(QUOTE, verkkaupi="Verkkaupi ehf.", stadsetning="Selfoss", language="Íslenska")
+BODIES = {"/quote": QUOTE, "/pdf": PDF, "/quotes": {"offers": [QUOTE] * 50}}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(pdf_workers):
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "verkx_service.py"), "--port", str(port),
+                             "--pdf-workers", str(pdf_workers)], cwd=ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Þjónustan fór ekki í gang.")
+
+
+def _client(url, path, body, stop, latencies, errors):
+    target = urlparse(url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+    payload = json.dumps(body).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, payload, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run(url, path, clients, seconds):
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_client, args=(url, path, BODIES[path], stop, latencies, errors)) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat = np.array(latencies) * 1000
+    return {
+        "endpoint": path,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+        "p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+        "max_ms": float(lat.max()) if len(lat) else None,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--endpoints", nargs="+", default=["/quote", "/quotes", "/pdf"], choices=list(BODIES))
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--pdf-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_service(args.pdf_workers)
+    try:
+        results = []
+        for path in args.endpoints:
+            for clients in args.clients:
+                r = run(url, path, clients, args.seconds)
+                results.append(r)
+                print(f"{path:8s} clients={clients:3d} {r['rps']:9.1f} req/s  p50 {r['p50_ms']:7.2f} ms  "
+                      f"p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}" + (f" ({r['first_error']})" if r['errors'] else ""))
+        conn = http.client.HTTPConnection(urlparse(url).hostname, urlparse(url).port, timeout=5)
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+        print("batcher:", health["batcher"])
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"url": url, "results": results, "health": health}, f, indent=2, ensure_ascii=False)
+    finally:
+        if proc is not None:
+            # SIGTERM: þjónustan lokar PDF ferlunum sjálf
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Mælir afköst PDF tilboða (tilboð/sek): stök köll á generate_offer_pdf og
+# runuvinnsla með generate_offer_pdfs yfir tilboð úr calculate_offers_bulk.
+#
+#   python bench/pdf_batch.py --offers 500 --processes 4
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from verkx_code import calculate_offer, calculate_offers_bulk, generate_offer_pdf, generate_offer_pdfs, offer_grid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offers", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--single", type=int, default=50)
+    args = parser.parse_args()
+
+    result = calculate_offer({"3m": 4, "2m": 10, "1m": 2}, 60, 146)
+    start = time.perf_counter()
+    generate_offer_pdf("Verkkaupi", "Selfoss", result)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.single):
+        generate_offer_pdf("Verkkaupi", "Selfoss", result)
+    single = args.single / (time.perf_counter() - start)
+    print(f"first offer (cold fonts/logo): {first * 1000:.1f} ms")
+    print(f"generate_offer_pdf: {single:.1f} offers/s")
+
+    grid = offer_grid(6, {"Selfoss": 30, "Akureyri": 490, "Ísafjörður": 570}, [146.0], [0.15])
+    offers = calculate_offers_bulk(grid.head(args.offers))
+    for processes in sorted({1, args.processes}):
+        start = time.perf_counter()
+        archive = generate_offer_pdfs(offers, processes=processes)
+        elapsed = time.perf_counter() - start
+        print(f"generate_offer_pdfs ({processes} proc): {len(offers) / elapsed:.1f} offers/s, "
+              f"{len(offers)} offers, {len(archive) / 1e6:.1f} MB zip")
+
+
+if __name__ == "__main__":
+    main()
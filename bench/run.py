@@ -0,0 +1,192 @@
+# Tímamælingar á opinberum föllum og þrepum verkx_code yfir gervigögn í mismunandi stærð.
+# Niðurstöður (min/miðgildi sek., hámarksminni) fara í JSON skrá sem má bera saman við fyrri keyrslu.
+#
+#   python bench/run.py --scales 1 10 100 --output bench/results.json
+#   python bench/run.py --scales 1 10 --compare bench/results.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+import numpy as np
+import pandas as pd
+
+import verkx_code as vk
+from synth import region_names, write_workbooks
+
+
+def measure(fn, repeat, setup=None):
+    # Fyrsta keyrsla undir tracemalloc fyrir hámarksminni, síðan `repeat` tímamældar keyrslur án þess
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min_s": min(times), "median_s": statistics.median(times), "peak_mb": peak / 1e6, "repeat": repeat}
+
+
+def bench_scale(scale, data_dir, repeat):
+    files = os.path.join(data_dir, f"scale_{scale}")
+    paths = {
+        "past_file": os.path.join(files, "GÖGN_VERKX.xlsx"),
+        "future_file": os.path.join(files, "Framtidarspa.xlsx"),
+        "share_file": os.path.join(files, "markadshlutdeild.xlsx"),
+    }
+    if not all(os.path.exists(p) for p in paths.values()):
+        start = time.perf_counter()
+        paths = write_workbooks(files, scale)
+        print(f"  generated scale {scale} workbooks in {time.perf_counter() - start:.1f} s")
+    past, future = paths["past_file"], paths["future_file"]
+    region = region_names(scale)[0]
+    results = {}
+
+    def sheets():
+        for f in (past, future):
+            for sheet in vk.WORKBOOK_CACHE.sheet_names(f):
+                if sheet.endswith(vk.SHEET_SUFFIX):
+                    vk.load_excel(f, sheet)
+
+    results["load_excel (cold)"] = measure(sheets, repeat, setup=vk.clear_caches)
+    sheets()
+    results["stream_demand_sheets"] = measure(lambda: [vk.stream_demand_sheets(f) for f in (past, future)], repeat)
+    results["stream_demand_sheets (miðspá only)"] = measure(
+        lambda: [vk.stream_demand_sheets(f, scenarios=["Miðspá"]) for f in (past, future)], repeat)
+    results["DemandStore build"] = measure(lambda: vk.DemandStore(past, future), repeat)
+    store = vk.get_demand_store(past, future)
+    results["ForecastCube build"] = measure(lambda: vk.ForecastCube(store), repeat)
+    results["main_forecast"] = measure(
+        lambda: vk.main_forecast("Íbúðir", region, 5, 0.5, seed=0, past_file=past, future_file=future), repeat)
+
+    # clear_caches hreinsar aðeins skyndiminni ferlisins; skyndimyndin (.npy) á disk stendur. "cold, xlsx" les því
+    # vinnubækurnar með slökkt á skyndimyndum og "snapshot warm-start" mælir hleðslu úr þýddri skyndimynd.
+    snapshot_enabled = vk.SNAPSHOT_ENABLED
+    vk.SNAPSHOT_ENABLED = False
+    try:
+        results["main_opperational_forecast (cold, xlsx)"] = measure(
+            lambda: vk.main_opperational_forecast(**paths), repeat, setup=vk.clear_caches)
+    finally:
+        vk.SNAPSHOT_ENABLED = snapshot_enabled
+    if snapshot_enabled:
+        vk.clear_caches()
+        vk.main_opperational_forecast(**paths)
+        results["main_opperational_forecast (snapshot warm-start)"] = measure(
+            lambda: vk.main_opperational_forecast(**paths), repeat, setup=vk.clear_caches)
+    vk.clear_caches()
+    vk.main_opperational_forecast(**paths)
+    for stage, stats in vk.OPERATIONAL_PIPELINE.stats.items():
+        results[f"stage {stage}"] = {"min_s": stats["seconds"], "median_s": stats["seconds"], "peak_mb": None, "repeat": 1}
+    margins = iter(np.linspace(0.1, 0.3, 10 * (repeat + 1)))
+    results["main_opperational_forecast (margin change)"] = measure(
+        lambda: vk.main_opperational_forecast(**paths, margin_2025=next(margins)), repeat)
+    results["simulate_operational_forecast (50k)"] = measure(
+        lambda: vk.simulate_operational_forecast(**paths, simulations=50000, seed=0), repeat)
+    return results
+
+
+def bench_common(repeat):
+    results = {}
+    values = np.linspace(100, 500, 5)
+    shares = np.linspace(0.05, 0.5, 5)
+    results["monte_carlo_simulation (100k)"] = measure(
+        lambda: vk.monte_carlo_simulation(values, shares, simulations=100000, seed=0), repeat)
+    modules = {"3m": 4, "2m": 10, "1m": 2, "0.5m": 1}
+    results["calculate_offer (x1000)"] = measure(
+        lambda: [vk.calculate_offer(modules, 60, 146) for _ in range(1000)], repeat)
+    grid = vk.offer_grid(10, {"Selfoss": 30, "Akureyri": 490, "Ísafjörður": 570}, [140.0, 146.0], [0.1, 0.15])
+    results[f"calculate_offers_bulk ({len(grid)} rows)"] = measure(lambda: vk.calculate_offers_bulk(grid), repeat)
+    from verkx_delivery import get_delivery_index
+    index = get_delivery_index()
+    rng = np.random.default_rng(0)
+    sites = pd.DataFrame({"stadsetning": rng.choice(list(index.keys), 10000)})
+    results["delivery lookup by name (10k)"] = measure(lambda: index.frame_km(sites), repeat)
+    coords = pd.DataFrame({"breidd": rng.uniform(63.4, 66.4, 10000), "lengd": rng.uniform(-24.0, -13.6, 10000)})
+    results["delivery lookup by coordinates (10k)"] = measure(lambda: index.frame_km(coords), repeat)
+    result = vk.calculate_offer(modules, 60, 146)
+    vk.generate_offer_pdf("Verkkaupi", "Selfoss", result)
+    results["generate_offer_pdf"] = measure(lambda: vk.generate_offer_pdf("Verkkaupi", "Selfoss", result), repeat)
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\n{'case':60s} {'baseline':>10s} {'now':>10s} {'ratio':>7s}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before or not before["median_s"]:
+            continue
+        ratio = now["median_s"] / before["median_s"]
+        flag = " <-- regression" if ratio > threshold else ""
+        print(f"{name:60s} {before['median_s']:10.4f} {now['median_s']:10.4f} {ratio:7.2f}{flag}")
+        if flag and not name.startswith("stage "):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, ".cache", "bench"))
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = {}
+    print("common")
+    for name, r in bench_common(args.repeat).items():
+        results[name] = r
+        print(f"  {name:58s} {r['median_s'] * 1000:10.2f} ms  {r['peak_mb']:8.1f} MB")
+    for scale in args.scales:
+        print(f"scale {scale}x ({len(region_names(scale))} regions)")
+        for name, r in bench_scale(scale, args.data_dir, args.repeat).items():
+            results[f"{scale}x/{name}"] = r
+            peak = "" if r["peak_mb"] is None else f"{r['peak_mb']:8.1f} MB"
+            print(f"  {name:58s} {r['median_s'] * 1000:10.2f} ms  {peak}")
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scales": args.scales,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.2f}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Býr til gervivinnubækur með sama sniði og data/*.xlsx, í stillanlegri stærð.
+# scale=1 samsvarar raungögnunum (8 landshlutar); scale=100 gefur 800 "sveitarfélög" o.s.frv.
+#
+#   python bench/synth.py --scale 10 --out /tmp/verkx_synth
+import argparse
+import os
+
+import numpy as np
+from openpyxl import Workbook
+
+HOUSING_TYPES = ["Íbúðir", "Atvinnuhús", "Elliheimili", "Leikskólar", "Gistirými"]
+FUTURE_TYPES = ["Íbúðir", "Leikskólar"]
+SCENARIOS = ["Háspá", "Miðspá", "Lágspá"]
+REAL_REGIONS = [
+    "Höfuðborgarsvæðið", "Suðurnes", "Vesturland", "Vestfirðir",
+    "Norðurland vestra", "Norðurland eystra", "Austurland", "Suðurland",
+]
+
+
+def region_names(scale):
+    if scale <= 1:
+        return list(REAL_REGIONS)
+    return [f"{REAL_REGIONS[i % len(REAL_REGIONS)]} {i // len(REAL_REGIONS) + 1:04d}" for i in range(len(REAL_REGIONS) * scale)]
+
+
+def _series(rng, n, level):
+    trend = rng.uniform(-0.02, 0.05) * level
+    return np.maximum(0, level + trend * np.arange(n) + rng.normal(0, 0.2 * level, n))
+
+
+def write_workbooks(out_dir, scale=1, past_years=(2006, 2024), future_years=(2024, 2034), seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    regions = region_names(scale)
+    past_range = np.arange(past_years[0], past_years[1] + 1)
+    future_range = np.arange(future_years[0], future_years[1] + 1)
+    paths = {
+        "past_file": os.path.join(out_dir, "GÖGN_VERKX.xlsx"),
+        "future_file": os.path.join(out_dir, "Framtidarspa.xlsx"),
+        "share_file": os.path.join(out_dir, "markadshlutdeild.xlsx"),
+    }
+
+    wb = Workbook(write_only=True)
+    for housing in HOUSING_TYPES:
+        ws = wb.create_sheet(f"{housing} eftir landshlutum")
+        ws.append(["AR", "LANDSHLUTI", "FJOLDI_FASTEIGNA", "MEDAL_FM_IBUÐA", "Fjöldi FM", "fjoldi eininga"])
+        for region in regions:
+            units = _series(rng, len(past_range), rng.uniform(5, 500))
+            for year, value in zip(past_range, units):
+                ws.append([int(year), region, int(value / 10), 95.0, float(value * 6.5), float(value)])
+    wb.save(paths["past_file"])
+
+    wb = Workbook(write_only=True)
+    for housing in FUTURE_TYPES:
+        ws = wb.create_sheet(f"{housing} eftir landshlutum")
+        with_scenarios = housing == "Íbúðir"
+        header = ["ar", "landshluti"] + (["Sviðsmynd"] if with_scenarios else []) + ["Samtals", "fm", "fjoldi eininga"]
+        ws.append(header)
+        for region in regions:
+            level = rng.uniform(5, 500)
+            for scenario, factor in zip(SCENARIOS if with_scenarios else [None], (1.2, 1.0, 0.8)):
+                units = _series(rng, len(future_range), level * factor)
+                for year, value in zip(future_range, units):
+                    row = [int(year), region] + ([scenario] if with_scenarios else [])
+                    ws.append(row + [float(value * 20), float(value * 6.5), float(value)])
+    wb.save(paths["future_file"])
+
+    wb = Workbook(write_only=True)
+    for housing in HOUSING_TYPES:
+        ws = wb.create_sheet(housing)
+        ws.append(["Landshluti", "markaðshlutdeild"])
+        for region in regions:
+            ws.append([region, float(rng.choice([0.0, 0.01, 0.02, 0.03]))])
+    wb.save(paths["share_file"])
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, path in write_workbooks(args.out, args.scale, seed=args.seed).items():
+        print(f"{name}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
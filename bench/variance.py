@@ -0,0 +1,74 @@
+# Breytileiki P5/P50/P95 mata eftir úrtaksaðferð og fjölda hermana.
+# Hvert (aðferð, n) er endurtekið --reps sinnum með ólíkum seed; staðalfrávik matanna milli endurtekninga
+# er borið saman við iid og "jafngilt iid n" = n * var(iid) / var(aðferð) sýnir hve mörgum iid hermunum
+# aðferðin jafngildir.
+#
+#   python bench/variance.py --reps 200 --sizes 250 1000 4000 16000
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+
+import verkx_code as vk
+
+
+def estimates(values, shares, n, sampling, reps, seed):
+    out = np.empty((reps, len(vk.MC_QUANTILES)))
+    start = time.perf_counter()
+    for r in range(reps):
+        totals = vk.simulation_totals(values, shares, n, seed=[seed, r], sampling=sampling)
+        out[r] = np.percentile(totals, vk.MC_QUANTILES)
+    return out, (time.perf_counter() - start) / reps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--housing", default="Íbúðir")
+    parser.add_argument("--region", default="Suðurland")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--share", type=float, default=0.5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 1000, 4000, 16000])
+    parser.add_argument("--reps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    cube = vk.get_forecast_cube()
+    _, linear, _, _ = cube.lookup(args.housing, args.region, args.years)
+    shares = np.linspace(args.share * 0.075, args.share, len(linear))
+
+    rows = []
+    header = f"{'sampling':11s} {'n':>7s} " + " ".join(f"{'sd ' + q:>10s}" for q in ("P5", "P50", "P95")) \
+        + " " + " ".join(f"{'x iid ' + q:>10s}" for q in ("P5", "P50", "P95")) + f" {'ms/run':>8s}"
+    print(f"{args.housing} / {args.region}, {args.years} ár, {args.reps} endurtekningar\n{header}")
+    for n in args.sizes:
+        baseline = None
+        for sampling in vk.MC_SAMPLING:
+            est, seconds = estimates(linear, shares, n, sampling, args.reps, args.seed)
+            var = est.var(axis=0, ddof=1)
+            if baseline is None:
+                baseline = var
+            gain = baseline / var
+            rows.append({
+                "sampling": sampling, "n": n,
+                "sd": dict(zip(("P5", "P50", "P95"), np.sqrt(var).tolist())),
+                "variance_ratio_vs_iid": dict(zip(("P5", "P50", "P95"), gain.tolist())),
+                "equivalent_iid_n": dict(zip(("P5", "P50", "P95"), (n * gain).tolist())),
+                "seconds_per_run": seconds,
+            })
+            print(f"{sampling:11s} {n:7d} " + " ".join(f"{v:10.3f}" for v in np.sqrt(var))
+                  + " " + " ".join(f"{g:10.3g}" for g in gain) + f" {seconds * 1000:8.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
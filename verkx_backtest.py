@@ -0,0 +1,214 @@
+# Afturvirk prófun (rolling origin) á spáaðferðum main_forecast yfir allar (húsnæði x landshluti) raðir.
+# Fyrir hvert upphafsár T er leitnin metin á fortíðargögnum til og með T og spáð fyrir T+1..T+horizon, og spárnar
+# bornar saman við raungögnin. Allar raðir eru metnar í einu með fit_linear_trends innan hvers upphafsárs og
+# upphafsárunum dreift á ferlahóp. Aðferðir:
+#   Fortíðargögn spá   leitnilína (linear_forecast)
+#   Framtíðarspá       gildi Framtidarspa fyrir markárið (miðspá, sú sviðsmynd sem main_forecast notar)
+#   Meðaltal           50/50 meðaltal hinna tveggja, eins og í main_forecast
+#   Síðasta gildi      síðasta þekkta gildi (viðmið)
+# Framtidarspa er ein útgáfa, ekki spá gerð við hvert upphafsár, svo hún er aðeins metin einu sinni á hvert
+# (röð, markár), við stysta spátímann. 'sameiginleg' dálkarnir bera allar fjórar aðferðir saman á nákvæmlega sömu
+# punktum: (röð, markár) sem Framtidarspa og raungögnin ná bæði yfir, frá síðasta upphafsári sem allar aðferðir
+# hafa spá frá.
+#
+#   python verkx_backtest.py --horizon 5 --min-train 5
+#   python verkx_backtest.py --out runs/afturprofun --format csv
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import verkx_code as vk
+
+BACKTEST_HORIZON = 5
+BACKTEST_MIN_TRAIN = 5
+BACKTEST_METHODS = ("Fortíðargögn spá", "Framtíðarspá", "Meðaltal", "Síðasta gildi")
+LINEAR, FUTURE, AVERAGE, NAIVE = range(len(BACKTEST_METHODS))
+
+_WORKER_GRID = None
+
+
+def backtest_grid(past_file=vk.PAST_FILE, future_file=vk.FUTURE_FILE):
+    # Þétt fylki yfir öll ár fortíðargagnanna: raungildi og framtíðarspá hvers (húsnæði, landshluti) pars;
+    # NaN þar sem gildi vantar. Sviðsmyndin er valin eins og í ForecastCube (miðspá ef blaðið hefur sviðsmyndir)
+    store = vk.get_demand_store(past_file, future_file)
+    pairs = [(h, r) for h in store.housing['past'] for r in store.regions('past', h)]
+    years = np.unique(np.concatenate([store.series('past', h, r)[0] for h, r in pairs]))
+    column = {int(y): i for i, y in enumerate(years)}
+    actual = np.full((len(pairs), len(years)), np.nan)
+    future = np.full((len(pairs), len(years)), np.nan)
+    scenarios = []
+    for k, (h, r) in enumerate(pairs):
+        y, v = store.series('past', h, r)
+        actual[k, [column[int(x)] for x in y]] = v
+        scenario = 'miðspá' if store.has_scenarios('future', h) else ''
+        fy, fv = store.series('future', h, r, scenario)
+        inside = np.isin(fy.astype(int), years.astype(int))
+        future[k, [column[int(x)] for x in fy[inside]]] = fv[inside]
+        scenarios.append(scenario)
+    return {
+        "pairs": pairs,
+        "years": years,
+        "actual": actual,
+        "future": future,
+        "scenarios": scenarios,
+    }
+
+
+def _init_worker(grid):
+    global _WORKER_GRID
+    _WORKER_GRID = grid
+
+
+def evaluate_origin(origin, horizon=BACKTEST_HORIZON, min_train=BACKTEST_MIN_TRAIN, grid=None):
+    # Allar spár frá einu upphafsári; skilar dict af fylkjum (röð, aðferð, ár fram, raungildi, spá, sameiginlegt)
+    grid = grid if grid is not None else _WORKER_GRID
+    years, actual = grid["years"], grid["actual"]
+    train = years <= origin
+    observed = ~np.isnan(actual) & train
+    fit = np.flatnonzero(observed.sum(axis=1) >= min_train)
+    out = {"series": [], "method": [], "horizon": [], "actual": [], "forecast": [], "common": []}
+    if len(fit) == 0:
+        return origin, {k: np.array(v) for k, v in out.items()}
+    slopes, intercepts = vk.fit_linear_trends([(years[observed[k]], actual[k, observed[k]]) for k in fit])
+    last = np.array([actual[k, observed[k]][-1] for k in fit])
+    linear = np.full(len(actual), np.nan)
+    naive = np.full(len(actual), np.nan)
+    pair_ids = np.arange(len(actual))
+
+    def add(series, method, h, truth, forecast, common):
+        keep = ~np.isnan(truth) & ~np.isnan(forecast)
+        out["series"].append(series[keep])
+        out["method"].append(np.full(keep.sum(), method))
+        out["horizon"].append(np.full(keep.sum(), h))
+        out["actual"].append(truth[keep])
+        out["forecast"].append(forecast[keep])
+        out["common"].append(common[keep])
+
+    for h in range(1, horizon + 1):
+        target = np.flatnonzero(years == origin + h)
+        if len(target) == 0:
+            continue
+        t = target[0]
+        linear[fit] = intercepts + slopes * float(years[t])
+        naive[fit] = last
+        truth = actual[:, t]
+        future = grid["future"][:, t]
+        average = (linear + future) / 2
+        # Punktar þar sem allar aðferðir hafa spá; run_backtest þrengir þá að einu upphafsári á (röð, markár)
+        common = ~np.isnan(linear) & ~np.isnan(naive) & ~np.isnan(future)
+        add(pair_ids, LINEAR, h, truth, linear, common)
+        add(pair_ids, NAIVE, h, truth, naive, common)
+        add(pair_ids, FUTURE, h, truth, future, common)
+        add(pair_ids, AVERAGE, h, truth, average, common)
+    return origin, {k: np.concatenate(v) if v else np.array([]) for k, v in out.items()}
+
+
+def run_backtest(past_file=vk.PAST_FILE, future_file=vk.FUTURE_FILE, horizon=BACKTEST_HORIZON, min_train=BACKTEST_MIN_TRAIN,
+                 workers=None):
+    # Skilar langri töflu með einni línu á (röð, aðferð, upphafsár, ár fram)
+    grid = backtest_grid(past_file, future_file)
+    years = grid["years"]
+    origins = [int(y) for y in years[min_train - 1:-1]]
+    if workers == 1:
+        results = [evaluate_origin(origin, horizon, min_train, grid) for origin in origins]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(grid,)) as executor:
+            results = list(executor.map(evaluate_origin, origins, [horizon] * len(origins), [min_train] * len(origins)))
+    pair_labels = np.array([(h, r) for h, r in grid["pairs"]] or np.empty((0, 2)), dtype=object)
+    scenarios = np.array(grid["scenarios"], dtype=object)
+    frames = []
+    for origin, rec in results:
+        if not len(rec["series"]):
+            continue
+        series = rec["series"].astype(np.int64)
+        method = rec["method"].astype(np.int64)
+        labels = pair_labels[series]
+        # Sviðsmyndin á aðeins við aðferðir sem nota Framtíðarspá
+        scenario = np.where((method == FUTURE) | (method == AVERAGE), scenarios[series], '')
+        frames.append(pd.DataFrame({
+            "husnaedi": labels[:, 0],
+            "landshluti": labels[:, 1],
+            "svidsmynd": scenario,
+            "adferd": np.array(BACKTEST_METHODS, dtype=object)[method],
+            "upphafsar": origin,
+            "ar_fram": rec["horizon"].astype(np.int64),
+            "ar": origin + rec["horizon"].astype(np.int64),
+            "raungildi": rec["actual"],
+            "spa": rec["forecast"],
+            "sameiginlegt": rec["common"].astype(bool),
+        }))
+    errors = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["husnaedi", "landshluti", "svidsmynd", "adferd", "upphafsar", "ar_fram", "ar", "raungildi", "spa", "sameiginlegt"])
+    # Sameiginlegir punktar: síðasta upphafsár á hvert (röð, markár) þar sem allar aðferðir hafa spá, svo hver
+    # aðferð er metin á sama punktasafni og hver Framtíðarspá-punktur aðeins einu sinni
+    pair_year = ["husnaedi", "landshluti", "ar"]
+    latest = errors[errors["sameiginlegt"]].groupby(pair_year)["upphafsar"].transform("max")
+    errors["sameiginlegt"] = errors["sameiginlegt"] & (errors["upphafsar"] == latest.reindex(errors.index))
+    # Framtíðarspáin er sú sama frá öllum upphafsárum; hún er talin einu sinni á (röð, markár), helst í
+    # sameiginlega punktinum og annars við stysta spátímann
+    future = errors["adferd"] == BACKTEST_METHODS[FUTURE]
+    first = (errors[future].sort_values(["sameiginlegt", "ar_fram"], ascending=[False, True], kind="stable")
+             .drop_duplicates(pair_year).index)
+    errors = errors[~future | errors.index.isin(first)].reset_index(drop=True)
+    errors["villa"] = errors["spa"] - errors["raungildi"]
+    errors["abs_villa"] = errors["villa"].abs()
+    # MAPE sleppir árum þar sem raungildið er 0
+    errors["ape"] = (errors["abs_villa"] / errors["raungildi"].abs().where(errors["raungildi"] != 0)) * 100
+    return errors
+
+
+def _scores(errors, keys):
+    grouped = errors.groupby(keys, sort=True)
+    return pd.DataFrame({
+        "fjoldi": grouped.size(),
+        "MAE": grouped["abs_villa"].mean(),
+        "MAPE": grouped["ape"].mean(),
+        "bjogun": grouped["villa"].mean(),
+    }).reset_index()
+
+
+def summarize_backtest(errors):
+    # MAE/MAPE á röð og aðferð, á aðferð og ár fram, og á aðferð (allir punktar og sameiginlegir punktar)
+    series = _scores(errors, ["husnaedi", "landshluti", "svidsmynd", "adferd"])
+    horizons = _scores(errors, ["adferd", "ar_fram"])
+    methods = _scores(errors, ["adferd"])
+    common = _scores(errors[errors["sameiginlegt"]], ["adferd"]).rename(
+        columns={"fjoldi": "fjoldi_sameiginleg", "MAE": "MAE_sameiginleg", "MAPE": "MAPE_sameiginleg", "bjogun": "bjogun_sameiginleg"})
+    methods = methods.merge(common, on="adferd", how="left")
+    return {"series": series, "horizons": horizons, "methods": methods}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Afturvirk prófun á leitnispá, Framtíðarspá og meðaltali þeirra.")
+    parser.add_argument("--past-file", default=vk.PAST_FILE)
+    parser.add_argument("--future-file", default=vk.FUTURE_FILE)
+    parser.add_argument("--horizon", type=int, default=BACKTEST_HORIZON)
+    parser.add_argument("--min-train", type=int, default=BACKTEST_MIN_TRAIN, help="Fæst ár í mati leitnilínu")
+    parser.add_argument("--workers", type=int, default=None, help="Fjöldi ferla (sjálfgefið fjöldi kjarna, 1 = án ferlahóps)")
+    parser.add_argument("--out", default=None, help="Mappa fyrir töflur; annars er aðeins samantekt prentuð")
+    parser.add_argument("--format", choices=["parquet", "csv", "xlsx"], default=None)
+    args = parser.parse_args(argv)
+    if args.min_train < 2:
+        parser.error("--min-train þarf að vera a.m.k. 2.")
+
+    start = time.perf_counter()
+    errors = run_backtest(args.past_file, args.future_file, args.horizon, args.min_train, args.workers)
+    summary = summarize_backtest(errors)
+    seconds = time.perf_counter() - start
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.float_format", "{:,.2f}".format):
+        print(summary["methods"].to_string(index=False))
+    print(f"{len(errors)} spápunktar, {summary['series']['landshluti'].size} (röð, aðferð) á {seconds:.2f} s")
+    if args.out:
+        from verkx_batch import _default_format, write_tables
+        os.makedirs(args.out, exist_ok=True)
+        write_tables({"backtest_errors": errors, "backtest_series": summary["series"],
+                      "backtest_horizons": summary["horizons"], "backtest_methods": summary["methods"]},
+                     args.out, args.format or _default_format())
+
+
+if __name__ == "__main__":
+    main()
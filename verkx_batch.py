@@ -0,0 +1,217 @@
+# Keyrir allar spár án Streamlit: main_forecast yfir (húsnæði x landshluti x ár fram í tímann x markaðshlutdeild)
+# og main_opperational_forecast fyrir hverja sviðsmynd. Vinnan dreifist á ferlahóp þar sem hvert ferli les
+# vinnubækurnar einu sinni (í initializer) og niðurstöður fara í Parquet eða CSV ásamt manifest.json.
+# Rekstrarspá sviðsmyndanna notar framtíðarspá íbúða og leikskóla og stuðul SCENARIO_SHARE; Rekstrarspá síðan í
+# appinu keyrir án sviðsmyndar (aðeins leitni fortíðargagna) og sýnir því hærri tölur.
+#
+#   python verkx_batch.py --out runs/nott --horizons 5 10 --shares 0.1 0.25 0.5
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import verkx_code as vk
+from verkx_export import write_parquet, write_xlsx
+
+BATCH_HORIZONS = (5, 10)
+BATCH_SHARES = (0.1, 0.25, 0.5)
+BATCH_SCENARIOS = ("Lágspá", "Miðspá", "Háspá")
+BATCH_CHUNKSIZE = 8
+
+_WORKER_FILES = None
+
+
+def _init_worker(past_file, future_file):
+    # Ein lesning á vinnubókunum á hvert ferli; öll verk ferlisins nota sama spáteninginn
+    global _WORKER_FILES
+    _WORKER_FILES = (past_file, future_file)
+    vk.get_forecast_cube(past_file, future_file)
+
+
+def _run_forecast(job):
+    i, housing, region, horizon, share, seed = job
+    past_file, future_file = _WORKER_FILES
+    start = time.perf_counter()
+    try:
+        df, summaries, used_years = vk.main_forecast(housing, region, horizon, share, seed=[seed, i],
+                                                     past_file=past_file, future_file=future_file)
+    except ValueError as e:
+        return i, None, None, str(e), time.perf_counter() - start
+    keys = {"husnaedi": housing, "landshluti": region, "ar_fram": horizon, "markadshlutdeild": share}
+    forecast = df.melt(id_vars="Ár", var_name="röð", value_name="einingar").assign(**keys)
+    summary = [dict(keys, hermun=s["title"], medaltal=s["mean"], notud_ar=used_years, **s["quantiles"]) for s in summaries]
+    return i, forecast, summary, None, time.perf_counter() - start
+
+
+def forecast_jobs(past_file, future_file, horizons=BATCH_HORIZONS, shares=BATCH_SHARES, housing=None, seed=0):
+    store = vk.get_demand_store(past_file, future_file)
+    jobs = []
+    for h in housing or store.housing['past']:
+        for region in store.regions('past', h):
+            for horizon in horizons:
+                for share in shares:
+                    jobs.append((len(jobs), h, region, int(horizon), float(share), seed))
+    return jobs
+
+
+def run_forecasts(jobs, past_file, future_file, workers=None, chunksize=BATCH_CHUNKSIZE):
+    forecasts, summaries, errors = [], [], []
+    seconds = 0.0
+    if workers == 1:
+        _init_worker(past_file, future_file)
+        results = map(_run_forecast, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(past_file, future_file))
+        results = executor.map(_run_forecast, jobs, chunksize=chunksize)
+    try:
+        for i, forecast, summary, error, took in results:
+            seconds += took
+            if error is not None:
+                _, housing, region, horizon, share, _ = jobs[i]
+                errors.append({"husnaedi": housing, "landshluti": region, "ar_fram": horizon, "markadshlutdeild": share, "villa": error})
+                continue
+            forecasts.append(forecast)
+            summaries.extend(summary)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    forecast_df = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame()
+    if not forecast_df.empty:
+        forecast_df = forecast_df[["husnaedi", "landshluti", "ar_fram", "markadshlutdeild", "Ár", "röð", "einingar"]]
+    return forecast_df, pd.DataFrame(summaries), errors, seconds
+
+
+def run_operational(past_file, future_file, share_file, scenarios=BATCH_SCENARIOS, margin=0.15):
+    units, costs = [], []
+    for scenario in scenarios:
+        yearly_units, df_cost = vk.main_opperational_forecast(past_file, future_file, share_file, margin, margin, margin, margin,
+                                                              scenario=scenario)
+        units.append(yearly_units.assign(svidsmynd=scenario))
+        costs.append(df_cost.assign(svidsmynd=scenario))
+    return pd.concat(units, ignore_index=True), pd.concat(costs, ignore_index=True)
+
+
+def _file_info(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "bytes": st.st_size, "mtime": st.st_mtime, "sha256": digest.hexdigest()}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_tables(tables, out_dir, fmt):
+    # Parquet: ein skrá á töflu í row group bútum. xlsx: allar töflurnar sem blöð í report.xlsx.
+    tables = {name: df.rename(columns=str) for name, df in tables.items()}
+    if fmt == "parquet":
+        files = {name: os.path.basename(path) for name, path in write_parquet(tables, out_dir).items()}
+    elif fmt == "xlsx":
+        write_xlsx(tables, os.path.join(out_dir, "report.xlsx"))
+        files = {name: f"report.xlsx#{name}" for name in tables}
+    else:
+        files = {}
+        for name, df in tables.items():
+            df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False, encoding="utf-8-sig")
+            files[name] = f"{name}.csv"
+    return {name: {"file": files[name], "rows": len(df), "columns": list(df.columns)} for name, df in tables.items()}
+
+
+def _default_format():
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keyrir allar eftirspurnar- og rekstrarspár í einu.")
+    parser.add_argument("--out", required=True, help="Mappa fyrir niðurstöður")
+    parser.add_argument("--past-file", default=vk.PAST_FILE)
+    parser.add_argument("--future-file", default=vk.FUTURE_FILE)
+    parser.add_argument("--share-file", default=vk.SHARE_FILE)
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(BATCH_HORIZONS))
+    parser.add_argument("--shares", type=float, nargs="+", default=list(BATCH_SHARES))
+    parser.add_argument("--housing", nargs="+", default=None)
+    parser.add_argument("--scenarios", nargs="+", default=list(BATCH_SCENARIOS))
+    parser.add_argument("--margin", type=float, default=0.15)
+    parser.add_argument("--workers", type=int, default=None, help="Fjöldi ferla (sjálfgefið fjöldi kjarna, 1 = án ferlahóps)")
+    parser.add_argument("--chunksize", type=int, default=BATCH_CHUNKSIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["parquet", "csv", "xlsx"], default=None)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or _default_format()
+    os.makedirs(args.out, exist_ok=True)
+    started = datetime.now()
+    timings = {}
+
+    start = time.perf_counter()
+    jobs = forecast_jobs(args.past_file, args.future_file, args.horizons, args.shares, args.housing, args.seed)
+    forecast_df, summary_df, errors, job_seconds = run_forecasts(jobs, args.past_file, args.future_file, args.workers, args.chunksize)
+    timings["forecasts_s"] = time.perf_counter() - start
+    timings["forecast_jobs_cpu_s"] = job_seconds
+
+    start = time.perf_counter()
+    units_df, cost_df = run_operational(args.past_file, args.future_file, args.share_file, args.scenarios, args.margin)
+    timings["operational_s"] = time.perf_counter() - start
+
+    tables = write_tables({
+        "forecast": forecast_df,
+        "forecast_summary": summary_df,
+        "operational_units": units_df,
+        "operational_cost": cost_df,
+    }, args.out, fmt)
+    manifest = {
+        "created": started.isoformat(timespec="seconds"),
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv[1:] if argv is None else list(argv),
+        "parameters": {
+            "horizons": args.horizons,
+            "shares": args.shares,
+            "housing": args.housing,
+            "scenarios": args.scenarios,
+            "margin": args.margin,
+            "seed": args.seed,
+            "workers": args.workers or os.cpu_count(),
+            "format": fmt,
+        },
+        "inputs": {name: _file_info(path) for name, path in
+                   (("past_file", args.past_file), ("future_file", args.future_file), ("share_file", args.share_file))},
+        "jobs": len(jobs),
+        "failed": errors,
+        "tables": tables,
+        "timings": timings,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "git_commit": _git_commit(),
+        },
+    }
+    with open(os.path.join(args.out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+    print(f"{len(jobs)} spár ({len(errors)} án gagna) á {timings['forecasts_s']:.1f} s, "
+          f"rekstrarspá {len(args.scenarios)} sviðsmyndir á {timings['operational_s']:.1f} s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
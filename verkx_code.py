@@ -1,200 +1,1002 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
 import unicodedata
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
-from fpdf import FPDF
 from io import BytesIO
+import verkx_diag as diag
 
 PAST_FILE = "data/GÖGN_VERKX.xlsx"
 FUTURE_FILE = "data/Framtidarspa.xlsx"
 SHARE_FILE = "data/markadshlutdeild.xlsx"
 UNIT_SIZE_SQM = 6.5
 FIXED_COST = 34800000
+SCENARIO_SHARE = {'lágspá': 0.01, 'miðspá': 0.03, 'háspá': 0.05}
+MODULE_SIZES = {'3_módúla': 19.5, '2_módúla': 13, '1_módúla': 6.5, '½_módúla': 3.25}
+MODULE_COSTS = {'3_módúla': 269700, '2_módúla': 290000, '1_módúla': 304500, '½_módúla': 330000}
+MODULE_SHARES = {'3_módúla': 0.19, '2_módúla': 0.80, '1_módúla': 0.01, '½_módúla': 0.0001}
+OPERATIONAL_YEARS = np.arange(2025, 2029)
 
 def normalize(text):
     nfkd = unicodedata.normalize('NFKD', str(text))
     return ''.join(c for c in nfkd if not unicodedata.combining(c)).lower().strip()
 
+class WorkbookCache:
+    # Sameiginlegt skyndiminni fyrir lesin Excel-blöð, deilt á milli allra Streamlit-lota.
+    # Lykill er (slóð, blað) og færslan geymir mtime/stærð skráar svo breytt skrá er lesin aftur.
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _stamp(file_path):
+        st = os.stat(file_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(key)
+                self.reloads += 1
+            self.misses += 1
+            return None
+
+    def _put(self, key, stamp, value, size):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (stamp, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def sheet(self, file_path, sheet_name):
+        key = (os.path.abspath(file_path), sheet_name)
+        stamp = self._stamp(file_path)
+        df = self._get(key, stamp)
+        diag.count("workbook_cache.miss" if df is None else "workbook_cache.hit")
+        if df is None:
+            with diag.timer("excel.read"):
+                df = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl")
+            df.columns = [col.strip().lower() for col in df.columns]
+            self._put(key, stamp, df, int(df.memory_usage(deep=True).sum()))
+        return df.copy()
+
+    def sheet_names(self, file_path):
+        key = (os.path.abspath(file_path), None)
+        stamp = self._stamp(file_path)
+        names = self._get(key, stamp)
+        if names is None:
+            with pd.ExcelFile(file_path, engine="openpyxl") as xl:
+                names = list(xl.sheet_names)
+            self._put(key, stamp, names, 0)
+        return list(names)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+WORKBOOK_CACHE = WorkbookCache()
+
 def load_excel(file_path, sheet_name):
-    df = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl")
-    df.columns = [col.strip().lower() for col in df.columns]
-    return df
+    return WORKBOOK_CACHE.sheet(file_path, sheet_name)
+
+SHEET_SUFFIX = " eftir landshlutum"
 
-def filter_data(df, region, demand_column):
-    df = df[df['landshluti'].str.strip().map(normalize) == normalize(region)].copy()
-    df.columns = [col.strip().lower() for col in df.columns]
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+def stream_demand_sheets(file_path, demand_column='fjoldi eininga', scenarios=None, sheet_suffix=SHEET_SUFFIX):
+    # Les blöð sem enda á sheet_suffix línu fyrir línu með openpyxl read-only og heldur aðeins
+    # ár, landshluta, eftirspurn og sviðsmynd. Gildum er breytt um leið (ár/eftirspurn í float,
+    # landshluti/sviðsmynd staðlað) og línum með ógildu ári/eftirspurn eða sviðsmynd utan
+    # `scenarios` er hent strax, svo minnisnotkun fylgir fjölda línanna sem haldið er.
+    # Skilar lista af (húsnæði, dálkar) þar sem dálkar er dict af fylkjum; 'scenario' er None ef blaðið hefur enga sviðsmynd
+    # og 'labels' varpar stöðluðum landshlutum á upprunalegt heiti.
+    from openpyxl import load_workbook
     demand_column = demand_column.lower()
-    if demand_column not in df.columns:
-        raise KeyError(f"'{demand_column}' fannst ekki.")
-    df['ar'] = pd.to_numeric(df['ar'], errors='coerce')
-    df = df.dropna(subset=['ar', demand_column])
-    df = df.sort_values('ar')
-    return df[['ar', demand_column]]
+    keep_scenarios = None if scenarios is None else {normalize(s) for s in scenarios}
+    names = {}
+
+    def norm(text):
+        # Fáir ólíkir landshlutar/sviðsmyndir, svo normalize() er geymt eftir hráa gildinu
+        found = names.get(text)
+        if found is None:
+            found = names[text] = normalize(str(text).strip())
+        return found
+
+    sheets = []
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if not ws.title.endswith(sheet_suffix):
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = [str(h).strip().lower() if h is not None else '' for h in next(rows, ())]
+            if demand_column not in header or 'landshluti' not in header or 'ar' not in header:
+                continue
+            i_year, i_region, i_value = header.index('ar'), header.index('landshluti'), header.index(demand_column)
+            i_scen = header.index('sviðsmynd') if 'sviðsmynd' in header else None
+            width = max(i_year, i_region, i_value, -1 if i_scen is None else i_scen) + 1
+            years, regions, values, scens = [], [], [], []
+            labels = {}
+            with diag.timer("excel.stream"):
+                for row in rows:
+                    if len(row) < width:
+                        row = tuple(row) + (None,) * (width - len(row))
+                    scen = ''
+                    if i_scen is not None:
+                        if row[i_scen] is None:
+                            continue
+                        scen = norm(row[i_scen])
+                        if keep_scenarios is not None and scen not in keep_scenarios:
+                            continue
+                    year, value, region = _to_float(row[i_year]), _to_float(row[i_value]), row[i_region]
+                    if year is None or value is None or region is None:
+                        continue
+                    years.append(year)
+                    values.append(value)
+                    key = norm(region)
+                    if key not in labels:
+                        labels[key] = str(region).strip()
+                    regions.append(key)
+                    scens.append(scen)
+            diag.count("excel.stream.rows", len(years))
+            sheets.append((ws.title[:-len(sheet_suffix)], {
+                'ar': np.array(years, dtype=float),
+                'region': np.array(regions, dtype=object),
+                'value': np.array(values, dtype=float),
+                'scenario': np.array(scens, dtype=object) if i_scen is not None else None,
+                'labels': labels,
+            }))
+    finally:
+        wb.close()
+    return sheets
+
+def sheet_series(columns):
+    # Skiptir blaði úr stream_demand_sheets í raðir: (landshluti, sviðsmynd, ár, gildi), raðað eftir ári
+    scenario = columns['scenario']
+    if scenario is None:
+        scenario = np.full(len(columns['ar']), '', dtype=object)
+    frame = pd.DataFrame({'region': columns['region'], 'scenario': scenario, 'ar': columns['ar'], 'value': columns['value']})
+    for (region, scen), group in frame.groupby(['region', 'scenario'], sort=False):
+        order = np.argsort(group['ar'].to_numpy(), kind='stable')
+        years = np.ascontiguousarray(group['ar'].to_numpy()[order])
+        values = np.ascontiguousarray(group['value'].to_numpy(dtype=float)[order])
+        yield region, scen, years, values
+
+class DemandStore:
+    # Allar raðir (uppruni, húsnæði, landshluti, sviðsmynd) lesnar einu sinni úr vinnubókunum.
+    # Landshlutar og sviðsmyndir eru staðlaðar með normalize() við uppbyggingu svo uppflettingar eru O(1).
+    # Blöðin eru lesin beint með stream_demand_sheets (ekki í gegnum WORKBOOK_CACHE) og
+    # scenarios=None heldur öllum sviðsmyndum.
+    def __init__(self, past_file=PAST_FILE, future_file=FUTURE_FILE, demand_column='fjoldi eininga', scenarios=None):
+        self.files = {'past': past_file, 'future': future_file}
+        self.demand_column = demand_column
+        self.scenarios = scenarios
+        self.stamp = self._file_stamp()
+        self.index = {}
+        self.scenario_sheets = set()
+        self.housing = {}
+        self.labels = {}
+        for source, file_path in self.files.items():
+            sheets = stream_demand_sheets(file_path, demand_column, scenarios)
+            self.housing[source] = [housing for housing, _ in sheets]
+            for housing, columns in sheets:
+                self._add_sheet(source, housing, columns)
+
+    def _file_stamp(self):
+        return tuple(WorkbookCache._stamp(f) for f in self.files.values())
+
+    def is_stale(self):
+        return self._file_stamp() != self.stamp
+
+    @classmethod
+    def from_snapshots(cls, snapshots, demand_column='fjoldi eininga'):
+        # snapshots: {'past': DemandSnapshot, 'future': DemandSnapshot} úr verkx_snapshot.
+        # Raðirnar eru sneiðar af minnisvörpuðum fylkjum og ekki afritaðar.
+        store = cls.__new__(cls)
+        store.files = {source: snap.file_path for source, snap in snapshots.items()}
+        store.demand_column = demand_column
+        store.scenarios = None
+        store.stamp = tuple(snap.stamp for snap in snapshots.values())
+        store.index = {}
+        store.scenario_sheets = set()
+        store.housing = {}
+        store.labels = {}
+        for source, snap in snapshots.items():
+            store.housing[source] = list(snap.housing)
+            for key, label in snap.labels.items():
+                store.labels.setdefault(key, label)
+            store.scenario_sheets.update((source, h) for h in snap.scenario_housing)
+            for (housing_key, region, scen), series in snap.series.items():
+                store.index[(source, housing_key, region, scen)] = series
+        return store
+
+    def _add_sheet(self, source, housing, columns):
+        housing_key = normalize(housing)
+        for key, label in columns['labels'].items():
+            self.labels.setdefault(key, label)
+        if columns['scenario'] is not None:
+            self.scenario_sheets.add((source, housing_key))
+        for region, scen, years, values in sheet_series(columns):
+            self.index[(source, housing_key, region, scen)] = (years, values)
+
+    def regions(self, source, housing):
+        # Upprunaleg heiti landshluta sem hafa röð fyrir (source, housing), í stafrófsröð staðlaða heitisins
+        housing_key = normalize(housing)
+        found = sorted({r for s, h, r, _ in self.index if s == source and h == housing_key})
+        return [self.labels.get(r, r) for r in found]
+
+    def has_scenarios(self, source, housing):
+        return (source, normalize(housing)) in self.scenario_sheets
+
+    def series(self, source, housing, region, scenario=''):
+        key = (source, normalize(housing), normalize(region), normalize(scenario) if scenario else '')
+        found = self.index.get(key)
+        if found is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=float)
+        return found
+
+# Gögnin eru lesin úr þýddri skyndimynd (verkx_snapshot) ef hægt er; xlsx skrárnar eru aðeins lesnar við þýðingu.
+# VERKX_SNAPSHOT=0 les alltaf beint úr xlsx.
+SNAPSHOT_ENABLED = os.environ.get("VERKX_SNAPSHOT", "1") != "0"
+
+def read_share_map(share_file):
+    share_df = load_excel(share_file, 0)
+    share_df.columns = [normalize(c) for c in share_df.columns]
+    return {normalize(row['landshluti']): row['markaðshlutdeild'] for _, row in share_df.iterrows()}
+
+def load_share_map(share_file=SHARE_FILE):
+    if SNAPSHOT_ENABLED:
+        import verkx_snapshot
+        try:
+            return verkx_snapshot.load_shares(share_file).share_map
+        except OSError:
+            diag.count("snapshot.error")
+    return read_share_map(share_file)
+
+def _build_demand_store(past_file, future_file):
+    if SNAPSHOT_ENABLED:
+        import verkx_snapshot
+        try:
+            return DemandStore.from_snapshots({'past': verkx_snapshot.load_demand(past_file),
+                                               'future': verkx_snapshot.load_demand(future_file)})
+        except OSError:
+            diag.count("snapshot.error")
+    return DemandStore(past_file, future_file)
+
+_DEMAND_STORES = {}
+_DEMAND_STORES_LOCK = threading.Lock()
+
+def get_demand_store(past_file=PAST_FILE, future_file=FUTURE_FILE):
+    key = (os.path.abspath(past_file), os.path.abspath(future_file))
+    with _DEMAND_STORES_LOCK:
+        store = _DEMAND_STORES.get(key)
+        if store is None or store.is_stale():
+            with diag.timer("demand_store.build"):
+                store = _build_demand_store(past_file, future_file)
+            _DEMAND_STORES[key] = store
+        return store
+
+def fit_linear_trends(series):
+    # Lokuð OLS-lausn fyrir margar mislangar raðir í einni umferð.
+    # series er listi af (ár, gildi) pörum; skilar hallatölum og skurðpunktum.
+    lengths = np.array([len(x) for x, _ in series], dtype=np.int64)
+    if (lengths == 0).any():
+        raise ValueError("Engin gögn til að reikna leitni.")
+    k = len(series)
+    if k == 0:
+        return np.empty(0), np.empty(0)
+    ids = np.repeat(np.arange(k), lengths)
+    x = np.concatenate([np.asarray(x, dtype=float) for x, _ in series])
+    y = np.concatenate([np.asarray(y, dtype=float) for _, y in series])
+    n = lengths.astype(float)
+    x_mean = np.bincount(ids, weights=x, minlength=k) / n
+    y_mean = np.bincount(ids, weights=y, minlength=k) / n
+    dx = x - x_mean[ids]
+    sxx = np.bincount(ids, weights=dx * dx, minlength=k)
+    sxy = np.bincount(ids, weights=dx * (y - y_mean[ids]), minlength=k)
+    slopes = np.divide(sxy, sxx, out=np.zeros(k), where=sxx > 0)
+    intercepts = y_mean - slopes * x_mean
+    return slopes, intercepts
+
+def predict_linear_trends(slopes, intercepts, years):
+    years = np.asarray(years, dtype=float)
+    return intercepts[:, None] + slopes[:, None] * years[None, :]
 
 def linear_forecast(df, demand_column, start_year, future_years):
-    X = df[['ar']].values
-    y = df[demand_column].values
-    model = LinearRegression().fit(X, y)
     future_years_range = np.array(range(start_year, start_year + future_years))
-    predictions = model.predict(future_years_range.reshape(-1, 1))
+    slopes, intercepts = fit_linear_trends([(df['ar'].values, df[demand_column].values)])
+    predictions = predict_linear_trends(slopes, intercepts, future_years_range)[0]
     return future_years_range, predictions
 
-def monte_carlo_simulation(values, market_shares, simulations=10000, volatility=0.1):
-    mean_value = np.mean(values)
-    scale = abs(mean_value * volatility)
-    results = []
-    for _ in range(simulations):
-        noise = np.random.normal(0, scale, len(values))
-        simulated = (values + noise) * market_shares
-        results.append(simulated)
-    return np.array(results)
-
-def plot_distribution(sim_data, title):
-    fig, ax = plt.subplots(figsize=(5, 3))
-    totals = np.sum(sim_data, axis=1)
-    ax.hist(totals, bins=40, alpha=0.7, edgecolor='black')
-    ax.set_title(title, fontsize=14, color='#003366')
+FORECAST_START_YEAR = 2025
+FORECAST_HOUSING = ["íbúðir", "leikskólar"]
+CUBE_HORIZON = 30
+
+class ForecastCube:
+    # Ákvörðunarbundni hluti main_forecast fyrir öll (húsnæði, landshluti) pör, reiknaður einu sinni.
+    # Markaðshlutdeild er ekki í teningnum heldur margfölduð inn við uppflettingu.
+    def __init__(self, store, horizon=CUBE_HORIZON, start_year=FORECAST_START_YEAR):
+        self.store = store
+        self.start_year = start_year
+        housing = sorted({h for source, h, _, _ in store.index if source == 'past'})
+        regions = sorted({r for source, _, r, _ in store.index if source == 'past'})
+        self.housing_index = {h: i for i, h in enumerate(housing)}
+        self.region_index = {r: i for i, r in enumerate(regions)}
+        shape = (len(housing), len(regions))
+
+        # Framtíðarspáin er geymd í heild svo teningurinn nái a.m.k. yfir lengstu röðina
+        future = {}
+        forecast_housing = [normalize(h) for h in FORECAST_HOUSING]
+        for h in housing:
+            if h not in forecast_housing:
+                continue
+            scenario = 'miðspá' if store.has_scenarios('future', h) else ''
+            for r in regions:
+                past_years, _ = store.series('past', h, r)
+                if len(past_years) == 0:
+                    continue
+                years, values = store.series('future', h, r, scenario)
+                keep = years > past_years.max()
+                future[(h, r)] = (years[keep], values[keep])
+        horizon = max([horizon] + [len(y) for y, _ in future.values()])
+        self.horizon = horizon
+        self.years = np.arange(start_year, start_year + horizon)
+
+        self.slopes = np.full(shape, np.nan)
+        self.intercepts = np.full(shape, np.nan)
+        cells = [(i, j) for h, i in self.housing_index.items() for r, j in self.region_index.items()
+                 if len(store.series('past', h, r)[0])]
+        if cells:
+            rows, cols = np.array(cells).T
+            slopes, intercepts = fit_linear_trends([store.series('past', housing[i], regions[j]) for i, j in cells])
+            self.slopes[rows, cols] = slopes
+            self.intercepts[rows, cols] = intercepts
+        self.linear = self.intercepts[..., None] + self.slopes[..., None] * self.years.astype(float)
+
+        self.future_len = np.zeros(shape, dtype=np.int64)
+        self.future_years = np.zeros(shape + (horizon,), dtype=np.int64)
+        self.future = np.full(shape + (horizon,), np.nan)
+        for (h, r), (years, values) in future.items():
+            i, j = self.housing_index[h], self.region_index[r]
+            self.future_len[i, j] = len(years)
+            self.future_years[i, j, :len(years)] = years
+            self.future[i, j, :len(values)] = values
+        self.average = (self.linear + self.future) / 2
+
+    def _cell(self, housing_type, region):
+        i = self.housing_index.get(normalize(housing_type))
+        j = self.region_index.get(normalize(region))
+        if i is None or j is None or np.isnan(self.slopes[i, j]):
+            raise ValueError("Engin fortíðargögn fundust.")
+        return i, j
+
+    def linear_prediction(self, i, j, future_years):
+        if future_years <= self.horizon:
+            return self.years[:future_years], self.linear[i, j, :future_years]
+        years = np.arange(self.start_year, self.start_year + future_years)
+        return years, self.intercepts[i, j] + self.slopes[i, j] * years.astype(float)
+
+    def lookup(self, housing_type, region, future_years):
+        # Skilar (ár, leitnispá, framtíðarspá, meðaltal); síðustu tvö eru None ef framtíðarspá dugar ekki
+        i, j = self._cell(housing_type, region)
+        if self.future_len[i, j] and self.future_len[i, j] >= future_years:
+            n = future_years
+            return (self.future_years[i, j, :n], self.linear[i, j, :n],
+                    self.future[i, j, :n], self.average[i, j, :n])
+        years, linear_pred = self.linear_prediction(i, j, future_years)
+        return years, linear_pred, None, None
+
+_FORECAST_CUBES = {}
+_FORECAST_CUBES_LOCK = threading.Lock()
+
+def get_forecast_cube(past_file=PAST_FILE, future_file=FUTURE_FILE):
+    # Teningurinn fylgir DemandStore og er endurbyggður þegar gagnaskrárnar breytast
+    store = get_demand_store(past_file, future_file)
+    key = (os.path.abspath(past_file), os.path.abspath(future_file))
+    with _FORECAST_CUBES_LOCK:
+        cube = _FORECAST_CUBES.get(key)
+        if cube is None or cube.store is not store:
+            with diag.timer("forecast_cube.build"):
+                cube = ForecastCube(store)
+            _FORECAST_CUBES[key] = cube
+        return cube
+
+MC_CHUNK_SIZE = 50000
+MC_SAMPLING = ("iid", "antithetic", "lhs", "sobol")
+
+def _householder(weights):
+    # Samhverft hornrétt fylki H með H e1 = weights / |weights|
+    w = np.asarray(weights, dtype=float)
+    norm = np.linalg.norm(w)
+    v = -w / norm if norm else w
+    v[0] += 1
+    vv = v @ v
+    if norm == 0 or vv < 1e-24:
+        return np.eye(len(w))
+    return np.eye(len(w)) - 2 * np.outer(v, v) / vv
+
+def _noise_sampler(rng, dims, sampling, dtype, weights=None):
+    # Skilar falli n -> (n x dims) staðalnormaldreifð gildi fyrir valda úrtaksaðferð.
+    # iid: óháð gildi beint úr rng. antithetic: hver blokk er z og -z. lhs: Latin hypercube á hverja blokk.
+    # sobol: ein scrambled Sobol runa sem heldur áfram milli blokka. lhs/sobol þurfa scipy.
+    # Ef weights er gefið (lhs/sobol) er úrtakinu snúið með hornréttu fylki svo fyrsti hnitásinn fylgi
+    # weights; vegin summa suðsins ræðst þá aðeins af fyrsta (best lagskipta) hnitinu. Dreifing hverrar
+    # hermunar er óbreytt N(0, I) því snúningurinn er hornréttur.
+    if sampling == "iid":
+        return lambda n: rng.standard_normal((n, dims), dtype=dtype)
+    if sampling == "antithetic":
+        def draw(n):
+            half = rng.standard_normal(((n + 1) // 2, dims), dtype=dtype)
+            return np.concatenate([half, -half])[:n]
+        return draw
+    if sampling not in MC_SAMPLING:
+        raise ValueError(f"Óþekkt úrtaksaðferð: {sampling}.")
+    import warnings
+    from scipy.special import ndtri
+    from scipy.stats import qmc
+    engine = qmc.Sobol(dims, scramble=True, seed=rng) if sampling == "sobol" else qmc.LatinHypercube(dims, seed=rng)
+    eps = np.finfo(float).eps
+    rotation = None if weights is None else _householder(weights)
+
+    def draw(n):
+        with warnings.catch_warnings():
+            # Sobol varar við n sem er ekki veldi af 2; jafnvægiseiginleikarnir skipta minna máli hér
+            warnings.simplefilter("ignore", UserWarning)
+            u = engine.random(n)
+        z = ndtri(np.clip(u, eps, 1 - eps))
+        if rotation is not None:
+            z = z @ rotation
+        return z.astype(dtype, copy=False)
+    return draw
+
+def _check_simulations(simulations, name="simulations"):
+    # Fjöldi hermana þarf að vera heiltala >= 1; 0 myndi annars falla seinna með óskýrri villu
+    if isinstance(simulations, bool) or not isinstance(simulations, (int, np.integer)) or simulations < 1:
+        raise ValueError(f"{name} þarf að vera heiltala, a.m.k. 1 (fékk {simulations!r}).")
+    return int(simulations)
+
+def monte_carlo_chunks(values, market_shares, simulations=10000, volatility=0.1, seed=None, dtype=np.float64, chunk_size=MC_CHUNK_SIZE,
+                       sampling="iid"):
+    # Dregur suðið í blokkum (chunk_size x ár) svo minnisnotkun haldist takmörkuð.
+    # Með sampling="iid" gefur sama seed sömu niðurstöðu óháð chunk_size.
+    simulations = _check_simulations(simulations)
+    rng = np.random.default_rng(seed)
+    values = np.asarray(values, dtype=dtype)
+    market_shares = np.broadcast_to(np.asarray(market_shares, dtype=dtype), values.shape)
+    scale = abs(np.mean(values) * volatility)
+    chunk_size = max(1, int(chunk_size))
+    # Heildin er summa (gildi + suð) * markaðshlutdeild, svo úrtakinu er snúið eftir markaðshlutdeildinni
+    draw = _noise_sampler(rng, len(values), sampling, dtype, weights=market_shares)
+    for start in range(0, simulations, chunk_size):
+        n = min(chunk_size, simulations - start)
+        block = draw(n)
+        block *= scale
+        block += values
+        block *= market_shares
+        yield block
+
+def monte_carlo_simulation(values, market_shares, simulations=10000, volatility=0.1, seed=None, dtype=np.float64, chunk_size=MC_CHUNK_SIZE,
+                           sampling="iid"):
+    simulations = _check_simulations(simulations)
+    values = np.asarray(values)
+    results = np.empty((simulations, len(values)), dtype=dtype)
+    start = 0
+    for block in monte_carlo_chunks(values, market_shares, simulations, volatility, seed, dtype, chunk_size, sampling):
+        results[start:start + len(block)] = block
+        start += len(block)
+    return results
+
+def simulation_totals(values, market_shares, simulations=10000, volatility=0.1, seed=None, dtype=np.float64, chunk_size=MC_CHUNK_SIZE,
+                      sampling="iid"):
+    # Heildareftirspurn hverrar hermunar án þess að geyma allt (hermanir x ár) fylkið
+    simulations = _check_simulations(simulations)
+    return np.concatenate([
+        block.sum(axis=1)
+        for block in monte_carlo_chunks(values, market_shares, simulations, volatility, seed, dtype, chunk_size, sampling)
+    ])
+
+MC_HIST_BINS = 40
+MC_QUANTILES = (5, 50, 95)
+MC_TOLERANCE = 0.01
+MC_CONFIDENCE_Z = 1.96
+MC_MIN_SIMULATIONS = 2000
+MC_MAX_SIMULATIONS = 200000
+MC_REPLICATES = 8
+
+def simulation_precision(totals, quantiles=MC_QUANTILES, z=MC_CONFIDENCE_Z):
+    # Hálfbreidd öryggisbila fyrir meðaltal (normalnálgun) og hlutfallsmörk (raðtölubil án dreifingarforsendu)
+    n = len(totals)
+    mean = float(np.mean(totals))
+    sd = float(np.std(totals, ddof=1)) if n > 1 else 0.0
+    p = np.asarray(quantiles, dtype=float) / 100
+    spread = z * np.sqrt(n * p * (1 - p))
+    lower = np.clip(np.floor(n * p - spread).astype(int), 0, n - 1)
+    upper = np.clip(np.ceil(n * p + spread).astype(int), 0, n - 1)
+    ordered = np.partition(totals, np.unique(np.concatenate([lower, upper])))
+    return {
+        "mean": mean,
+        "sd": sd,
+        "mean_halfwidth": z * sd / np.sqrt(n) if n else np.inf,
+        "quantile_halfwidth": {f"P{q}": float(ordered[u] - ordered[l]) / 2 for q, l, u in zip(quantiles, lower, upper)},
+    }
+
+def adaptive_simulation_totals(values, market_shares, tolerance=MC_TOLERANCE, time_budget=None, volatility=0.1, seed=None,
+                               dtype=np.float64, min_simulations=None, max_simulations=MC_MAX_SIMULATIONS,
+                               quantiles=MC_QUANTILES, z=MC_CONFIDENCE_Z, sampling="iid", replicates=MC_REPLICATES):
+    # Dregur hermanir í lotum þar til hálfbreidd öryggisbila meðaltals og hlutfallsmarka heildanna er
+    # undir tolerance * max(|meðaltal|, staðalfrávik), tímamörk (sek.) renna út eða max_simulations er náð.
+    # Lotustærð ræðst af því hve langt er í mörkin (mest fjórföldun í hverri lotu). Með sampling="iid" eru
+    # lotur dregnar í röð úr sama rng, svo niðurstaðan með n hermunum er sú sama og simulation_totals(simulations=n).
+    # Raðtölubilin gera ráð fyrir óháðum úrtökum; fyrir antithetic/lhs/sobol er dregið í `replicates` óháðum
+    # slembuðum eftirmyndum og öryggisbilin metin út frá dreifingu matanna milli þeirra (t-dreifing).
+    # Skilar (totals, info) þar sem info segir hve margar hermanir voru notaðar og hvers vegna var hætt.
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    iid = sampling == "iid"
+    if min_simulations is None:
+        # lhs/sobol ná sömu nákvæmni með mun færri hermunum (sjá bench/variance.py)
+        min_simulations = MC_MIN_SIMULATIONS if sampling in ("iid", "antithetic") else MC_MIN_SIMULATIONS // 5
+    groups = 1 if iid else max(2, int(replicates))
+    min_simulations = _check_simulations(min_simulations, "min_simulations")
+    max_simulations = _check_simulations(max_simulations, "max_simulations")
+    if max_simulations < groups:
+        raise ValueError(f"max_simulations ({max_simulations}) er minna en fjöldi eftirmynda ({groups}) fyrir "
+                         f"sampling='{sampling}'; hækkaðu max_simulations eða lækkaðu replicates.")
+    if not iid:
+        from scipy.stats import norm, t
+        t_value = float(t.ppf(norm.cdf(z), groups - 1))
+    parts = [[] for _ in range(groups)]
+    n = 0
+    target = min(max(min_simulations, groups), max_simulations)
+    while True:
+        # A.m.k. ein hermun á eftirmynd í lotu, annars getur lykkjan staðið í stað þegar min_simulations < groups
+        per_group = max(1, (target - n) // groups)
+        for g in range(groups):
+            parts[g].append(simulation_totals(values, market_shares, per_group, volatility, rng, dtype, sampling=sampling))
+            parts[g] = [np.concatenate(parts[g])] if len(parts[g]) > 1 else parts[g]
+        n += per_group * groups
+        totals = parts[0][0] if iid else np.concatenate([p[0] for p in parts])
+        precision = simulation_precision(totals, quantiles, z)
+        if not iid:
+            estimates = np.array([[np.mean(p[0])] + list(np.percentile(p[0], quantiles)) for p in parts])
+            halfwidth = t_value * estimates.std(axis=0, ddof=1) / np.sqrt(groups)
+            precision["mean_halfwidth"] = float(halfwidth[0])
+            precision["quantile_halfwidth"] = {f"P{q}": float(h) for q, h in zip(quantiles, halfwidth[1:])}
+        threshold = tolerance * max(abs(precision["mean"]), precision["sd"])
+        worst = max([precision["mean_halfwidth"]] + list(precision["quantile_halfwidth"].values()))
+        elapsed = time.perf_counter() - start
+        if worst <= threshold:
+            reason = "tolerance"
+        elif n + groups > max_simulations:
+            reason = "max_simulations"
+        elif time_budget is not None and elapsed >= time_budget:
+            reason = "time_budget"
+        else:
+            # Hálfbreidd minnkar eins og 1/sqrt(n) (hraðar fyrir lhs/sobol, svo spáin er varfærin)
+            needed = n * (worst / threshold) ** 2 * 1.1 if threshold > 0 else 4 * n
+            target = int(min(max_simulations, 4 * n, max(needed, n + min_simulations)))
+            continue
+        info = dict(precision, simulations=n, converged=reason == "tolerance", reason=reason,
+                    tolerance=tolerance, threshold=threshold, seconds=elapsed, sampling=sampling, replicates=groups)
+        diag.count("monte_carlo.adaptive.simulations", n)
+        return totals, info
+
+def summarize_simulation(totals, title, bins=MC_HIST_BINS):
+    # Þétt samantekt í stað myndar: tíðnirit (counts/edges) og hlutfallsmörk reiknuð einu sinni
+    totals = np.asarray(totals)
+    if totals.ndim == 2:
+        totals = totals.sum(axis=1)
+    counts, edges = np.histogram(totals, bins=bins)
+    quantiles = np.percentile(totals, MC_QUANTILES)
+    return {
+        "title": title,
+        "counts": counts,
+        "edges": edges,
+        "quantiles": {f"P{q}": float(v) for q, v in zip(MC_QUANTILES, quantiles)},
+        "mean": float(np.mean(totals)),
+        "simulations": len(totals),
+    }
+
+@diag.timed()
+def plot_distribution(summary, dpi=100):
+    # Teiknar samantekt með Agg beint (ekki pyplot) svo myndin fer ekki í alþjóðlega skrá pyplot
+    # og losnar um leið og PNG bætin eru tilbúin. Skilar PNG bætum.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(5, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    edges = summary["edges"]
+    ax.bar(edges[:-1], summary["counts"], width=np.diff(edges), align='edge', alpha=0.7, edgecolor='black')
+    ax.set_title(summary["title"], fontsize=14, color='#003366')
     ax.set_xlabel("Total Forecasted Demand")
     ax.set_ylabel("Frequency")
-    plt.tight_layout()
-    return fig
-
-def main_forecast(housing_type, region, future_years, final_market_share):
-    sheet_name = f"{housing_type} eftir landshlutum"
-    use_forecast = housing_type.lower() in ["íbúðir", "leikskólar"]
-
-    past_df = load_excel(PAST_FILE, sheet_name)
-    demand_column = 'fjoldi eininga'
-    past_data = filter_data(past_df, region, demand_column)
-    if past_data.empty:
-        raise ValueError("Engin fortíðargögn fundust.")
-
-    initial_share = final_market_share * np.random.uniform(0.05, 0.1)
-
-    if use_forecast:
-        future_df = load_excel(FUTURE_FILE, sheet_name)
-        if 'sviðsmynd' in future_df.columns:
-            future_df = future_df[future_df['sviðsmynd'].str.lower() == 'miðspá']
-        future_df['ar'] = pd.to_numeric(future_df['ar'], errors='coerce')
-        future_data = filter_data(future_df, region, demand_column)
-        future_data = future_data[future_data['ar'] > past_data['ar'].max()]
-        if len(future_data) < future_years:
-            use_forecast = False
-
-    if not use_forecast:
-        linear_years, linear_pred = linear_forecast(past_data, demand_column, 2025, future_years)
-        market_shares = np.linspace(initial_share, final_market_share, future_years)
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    fig.clear()
+    return buffer.getvalue()
+
+@diag.timed()
+def main_forecast(housing_type, region, future_years, final_market_share, seed=None, past_file=PAST_FILE, future_file=FUTURE_FILE,
+                  tolerance=None, time_budget=None, sampling="iid"):
+    # tolerance=None keyrir fastan fjölda hermana (10000); annars er adaptive_simulation_totals notað
+    # og hver samantekt fær 'convergence' með fjölda hermana og öryggisbilum
+    rng = np.random.default_rng(seed)
+
+    def simulate(vals):
+        if tolerance is None:
+            return simulation_totals(vals, market_shares, seed=rng, sampling=sampling), None
+        return adaptive_simulation_totals(vals, market_shares, tolerance, time_budget, seed=rng, sampling=sampling)
+
+    def summarize(simulated, title):
+        summary = summarize_simulation(simulated[0], title)
+        if simulated[1] is not None:
+            summary["convergence"] = simulated[1]
+        return summary
+
+    with diag.timer("main_forecast.lookup"):
+        cube = get_forecast_cube(past_file, future_file)
+        years, linear_pred, future_values, avg_vals = cube.lookup(housing_type, region, future_years)
+
+    initial_share = final_market_share * rng.uniform(0.05, 0.1)
+    market_shares = np.linspace(initial_share, final_market_share, len(years))
+
+    if future_values is None:
         past_pred_adj = linear_pred * market_shares
-        sim_past = monte_carlo_simulation(linear_pred, market_shares)
-        df = pd.DataFrame({'Ár': linear_years, 'Spá útfrá fortíðargögnum': past_pred_adj})
-        figures = [plot_distribution(sim_past, "Monte Carlo - Historical Data")]
-        return df, figures, future_years
+        with diag.timer("main_forecast.monte_carlo"):
+            sim_past = simulate(linear_pred)
+        df = pd.DataFrame({'Ár': years, 'Spá útfrá fortíðargögnum': past_pred_adj})
+        with diag.timer("main_forecast.summarize"):
+            summaries = [summarize(sim_past, "Monte Carlo - Historical Data")]
+        return df, summaries, future_years
     else:
-        future_values = future_data['fjoldi eininga'].values[:future_years]
-        future_years_vals = future_data['ar'].values[:future_years]
-        market_shares = np.linspace(initial_share, final_market_share, len(future_values))
-        linear_years, linear_pred = linear_forecast(past_data, demand_column, 2025, len(future_values))
-        linear_pred = linear_pred[:len(future_values)]
-        avg_vals = (linear_pred + future_values) / 2
         linear_pred_adj = linear_pred * market_shares
         future_values_adj = future_values * market_shares
         avg_vals_adj = avg_vals * market_shares
-        sim_avg = monte_carlo_simulation(avg_vals, market_shares)
+        with diag.timer("main_forecast.monte_carlo"):
+            sim_avg = simulate(avg_vals)
+            sim_linear = simulate(linear_pred)
+            sim_future = simulate(future_values)
         df = pd.DataFrame({
-            'Ár': future_years_vals,
+            'Ár': years,
             'Fortíðargögn spá': linear_pred_adj,
             'Framtíðarspá': future_values_adj,
             'Meðaltal': avg_vals_adj
         })
-        figures = [
-            plot_distribution(monte_carlo_simulation(linear_pred, market_shares), "Monte Carlo - Historical Data"),
-            plot_distribution(monte_carlo_simulation(future_values, market_shares), "Monte Carlo - Future Forecast"),
-            plot_distribution(sim_avg, "Monte Carlo - Average")
-        ]
-        return df, figures, len(future_values)
+        with diag.timer("main_forecast.summarize"):
+            summaries = [
+                summarize(sim_linear, "Monte Carlo - Historical Data"),
+                summarize(sim_future, "Monte Carlo - Future Forecast"),
+                summarize(sim_avg, "Monte Carlo - Average")
+            ]
+        return df, summaries, len(future_values)
 
-def main_opperational_forecast(past_file, future_file, share_file, margin_2025=0.15, margin_2026=0.15, margin_2027=0.15, margin_2028=0.15):
-    SCENARIO_SHARE = {'lágspá': 0.01, 'miðspá': 0.03, 'háspá': 0.05}
-    MODULE_SIZES = {'3_módúla': 19.5, '2_módúla': 13, '1_módúla': 6.5, '½_módúla': 3.25}
-    MODULE_COSTS = {'3_módúla': 269700, '2_módúla': 290000, '1_módúla': 304500, '½_módúla': 330000}
-    MODULE_SHARES = {'3_módúla': 0.19, '2_módúla': 0.80, '1_módúla': 0.01, '½_módúla': 0.0001}
-    FIXED_COST = 34800000
+class StagedPipeline:
+    # Reikniþrep með skráðum inntökum (breytum eða öðrum þrepum). Síðasta niðurstaða hvers þreps
+    # er geymd og aðeins endurreiknuð ef eitthvert inntak hennar hefur breyst.
+    def __init__(self, name):
+        self.name = name
+        self.stages = OrderedDict()
+        self.stats = {}
+        self._memo = {}
+        self._lock = threading.RLock()
 
-    share_df = pd.read_excel(share_file, engine="openpyxl")
-    share_df.columns = [normalize(c) for c in share_df.columns]
-    share_map = {normalize(row['landshluti']): row['markaðshlutdeild'] for _, row in share_df.iterrows()}
-
-    past_xl = pd.ExcelFile(past_file, engine="openpyxl")
-    suffix = " eftir landshlutum"
-    types = [s[:-len(suffix)] for s in past_xl.sheet_names if s.endswith(suffix)]
-    regions = list(share_map.keys())
-
-    all_rows = []
-    for housing in types:
-        sheet_name = f"{housing} eftir landshlutum"
-        use_future = normalize(housing) in ['íbúðir', 'leikskólar']
-        scenarios = ['miðspá'] if use_future else ['']
-
-        for region in regions:
-            share = share_map.get(region, 0)
-            for scen in scenarios:
-                df_past = load_excel(past_file, sheet_name)
-                past = filter_data(df_past, region, "fjoldi eininga")
-                years, past_pred = linear_forecast(past, "fjoldi eininga", 2025, 4)
-                df_result = pd.DataFrame({'Ár': years, 'fortíð': past_pred})
-
-                if scen:
-                    df_fut = load_excel(future_file, sheet_name)
-                    df_fut = df_fut[df_fut['sviðsmynd'].str.lower() == scen]
-                    future = filter_data(df_fut, region, "fjoldi eininga")
-                    _, fut_pred = linear_forecast(future, "fjoldi eininga", 2025, 4)
-                    if len(fut_pred) == 4:
-                        df_result['framtíð'] = fut_pred
-                        df_result['meðaltal'] = (df_result['fortíð'] + df_result['framtíð']) / 2
-
-                base = df_result['meðaltal'] if 'meðaltal' in df_result.columns else df_result['fortíð']
-                factor = SCENARIO_SHARE.get(scen, 1)
-                df_result['einingar'] = base * share * factor
-                df_result['Ár'] = years
-                all_rows.append(df_result[['Ár', 'einingar']])
-
-    df_all = pd.concat(all_rows)
-    yearly_units = df_all.groupby("Ár")["einingar"].sum().reset_index()
+    def stage(self, name, *inputs):
+        def register(fn):
+            self.stages[name] = (fn, inputs)
+            self.stats[name] = {"runs": 0, "hits": 0, "seconds": 0.0}
+            return fn
+        return register
+
+    def graph(self):
+        return {name: list(inputs) for name, (_, inputs) in self.stages.items()}
+
+    def downstream(self, name):
+        # Öll þrep sem þarf að endurreikna ef `name` (breyta eða þrep) breytist
+        found = []
+        for stage, (_, inputs) in self.stages.items():
+            if name in inputs or any(i in found for i in inputs):
+                found.append(stage)
+        return found
+
+    def invalidate(self):
+        with self._lock:
+            self._memo.clear()
+
+    def run(self, target, **params):
+        return self.run_many([target], **params)[0]
+
+    def run_many(self, targets, **params):
+        with self._lock:
+            resolved = {}
+            return [self._resolve(target, params, resolved)[1] for target in targets]
+
+    def _resolve(self, name, params, resolved):
+        if name in resolved:
+            return resolved[name]
+        fn, inputs = self.stages[name]
+        tokens, args = [], []
+        for inp in inputs:
+            if inp in self.stages:
+                token, value = self._resolve(inp, params, resolved)
+            else:
+                token = value = params[inp]
+            tokens.append(token)
+            args.append(value)
+        key = tuple(tokens)
+        stats = self.stats[name]
+        memo = self._memo.get(name)
+        if memo is not None and memo[0] == key:
+            stats["hits"] += 1
+            diag.count(f"{self.name}.{name}.hit")
+        else:
+            start = time.perf_counter()
+            value = fn(*args)
+            stats["seconds"] = time.perf_counter() - start
+            stats["runs"] += 1
+            diag.record(f"{self.name}.{name}", stats["seconds"])
+            version = memo[2] + 1 if memo is not None else 0
+            memo = (key, value, version)
+            self._memo[name] = memo
+        # Niðurstreymisþrep bera saman (nafn, útgáfu) í stað gildisins sjálfs
+        resolved[name] = ((name, memo[2]), memo[1])
+        return resolved[name]
+
+OPERATIONAL_PIPELINE = StagedPipeline("rekstrarspá")
+
+@OPERATIONAL_PIPELINE.stage("load", "past_file", "future_file", "share_file", "data_stamp")
+def _op_load(past_file, future_file, share_file, data_stamp):
+    share_map = load_share_map(share_file)
+    store = get_demand_store(past_file, future_file)
+    return {
+        "store": store,
+        "share_map": share_map,
+        "types": list(store.housing['past']),
+        "regions": list(share_map.keys()),
+    }
+
+_SCENARIO_FACTORS = {normalize(k): v for k, v in SCENARIO_SHARE.items()}
+
+def _scenario_factor(scenario):
+    # Raðir án sviðsmyndar ('') fá stuðulinn 1
+    if not scenario:
+        return 1
+    factor = _SCENARIO_FACTORS.get(normalize(scenario))
+    if factor is None:
+        raise ValueError(f"Óþekkt sviðsmynd: {scenario}.")
+    return factor
+
+@OPERATIONAL_PIPELINE.stage("series_forecast", "load", "scenario")
+def _op_series_forecast(loaded, scenario):
+    store = loaded["store"]
+    # Án sviðsmyndar (sjálfgefið, Rekstrarspá síðan) er hver röð leitnilína fortíðargagna. Með sviðsmynd
+    # (verkx_batch) nota íbúðir og leikskólar líka framtíðarspána (sviðsmynd ef blaðið hefur hana) og fá
+    # sviðsmyndarstuðul SCENARIO_SHARE.
+    future_housing = {normalize(h) for h in FORECAST_HOUSING} if scenario else set()
+    jobs, future = [], []
+    for housing in loaded["types"]:
+        use_future = normalize(housing) in future_housing
+        future_scenario = scenario if store.has_scenarios('future', housing) else ''
+        for region in loaded["regions"]:
+            future_series = store.series('future', housing, region, future_scenario) if use_future else None
+            if future_series is not None and len(future_series[0]):
+                future.append((len(jobs), future_series))
+            jobs.append((housing, region, scenario if use_future else ''))
+
+    # Allar leitnilínur (fortíð og framtíð) eru reiknaðar saman í einni umferð
+    future_jobs = [i for i, _ in future]
+    series = [store.series('past', housing, region) for housing, region, _ in jobs]
+    series += [future_series for _, future_series in future]
+    predictions = predict_linear_trends(*fit_linear_trends(series), OPERATIONAL_YEARS)
+    base = predictions[:len(jobs)].copy()
+    if future_jobs:
+        base[future_jobs] = (base[future_jobs] + predictions[len(jobs):]) / 2
+    return {"jobs": jobs, "base": base}
+
+@OPERATIONAL_PIPELINE.stage("units", "load", "series_forecast")
+def _op_units(loaded, forecast):
+    share_map = loaded["share_map"]
+    factors = np.array([share_map.get(region, 0) * _scenario_factor(scen) for _, region, scen in forecast["jobs"]])
+    units = forecast["base"] * factors[:, None]
+    yearly_units = pd.DataFrame({'Ár': OPERATIONAL_YEARS, 'einingar': units.sum(axis=0)})
     yearly_units['heildarfermetrar'] = yearly_units['einingar'] * 6.5
+    return yearly_units
+
+def _module_units(heildarfermetrar):
+    # Fjöldi eininga af hverri stærð; virkar jafnt á stök ár og (hermanir x ár) fylki
+    return {key: np.round(heildarfermetrar / MODULE_SIZES[key] * MODULE_SHARES[key], 2) for key in MODULE_SIZES}
 
-    for key in MODULE_SIZES:
-        size = MODULE_SIZES[key]
-        yearly_units[f'{key} einingar'] = (yearly_units['heildarfermetrar'] / size * MODULE_SHARES[key]).round(2)
+def _operational_costs(heildarfermetrar, module_units):
+    costs = {f'kostnaður_{key}': module_units[key] * MODULE_SIZES[key] * MODULE_COSTS[key] for key in MODULE_SIZES}
+    costs['kostnaðarverð eininga'] = sum(costs[f'kostnaður_{key}'] for key in MODULE_SIZES)
+    costs['flutningskostnaður'] = heildarfermetrar * 43424
+    costs['afhending innanlands'] = heildarfermetrar * 80 * 8
+    costs['fastur kostnaður'] = FIXED_COST
+    costs['heildarkostnaður'] = (costs['kostnaðarverð eininga'] + costs['flutningskostnaður']
+                                 + costs['afhending innanlands'] + costs['fastur kostnaður'])
+    return costs
 
+@OPERATIONAL_PIPELINE.stage("module_mix", "units")
+def _op_module_mix(units):
+    yearly_units = units.copy()
+    for key, values in _module_units(yearly_units['heildarfermetrar'].to_numpy()).items():
+        yearly_units[f'{key} einingar'] = values
+    return yearly_units
+
+@OPERATIONAL_PIPELINE.stage("cost", "module_mix")
+def _op_cost(yearly_units):
     df_cost = yearly_units[['Ár']].copy()
-    for key in MODULE_SIZES:
-        df_cost[f'kostnaður_{key}'] = yearly_units[f'{key} einingar'] * MODULE_SIZES[key] * MODULE_COSTS[key]
-
-    mod_cols = [f'kostnaður_{k}' for k in MODULE_SIZES]
-    df_cost['kostnaðarverð eininga'] = df_cost[mod_cols].sum(axis=1)
-    df_cost['flutningskostnaður'] = yearly_units['heildarfermetrar'] * 43424
-    df_cost['afhending innanlands'] = yearly_units['heildarfermetrar'] * 80 * 8
-    df_cost['fastur kostnaður'] = FIXED_COST
-    df_cost['heildarkostnaður'] = df_cost[['kostnaðarverð eininga', 'flutningskostnaður', 'afhending innanlands', 'fastur kostnaður']].sum(axis=1)
-
-    margin_map = {2025: margin_2025, 2026: margin_2026, 2027: margin_2027, 2028: margin_2028}
-    df_cost['arðsemiskrafa'] = df_cost['Ár'].map(margin_map)
+    module_units = {key: yearly_units[f'{key} einingar'].to_numpy() for key in MODULE_SIZES}
+    for column, values in _operational_costs(yearly_units['heildarfermetrar'].to_numpy(), module_units).items():
+        df_cost[column] = values
+    return df_cost
+
+@OPERATIONAL_PIPELINE.stage("profit", "cost", "margins")
+def _op_profit(cost, margins):
+    df_cost = cost.copy()
+    df_cost['arðsemiskrafa'] = df_cost['Ár'].map(dict(margins))
     df_cost['tekjur'] = df_cost['heildarkostnaður'] * (1 + df_cost['arðsemiskrafa'])
     df_cost['hagnaður'] = df_cost['tekjur'] - df_cost['heildarkostnaður']
+    return df_cost
 
-    return yearly_units, df_cost
+def clear_caches():
+    # Hreinsar öll skyndiminni í ferlinu (vinnubækur, skyndimyndir, DemandStore, spáteningar og rekstrarþrep)
+    WORKBOOK_CACHE.clear()
+    with _DEMAND_STORES_LOCK:
+        _DEMAND_STORES.clear()
+    with _FORECAST_CUBES_LOCK:
+        _FORECAST_CUBES.clear()
+    OPERATIONAL_PIPELINE.invalidate()
+    if SNAPSHOT_ENABLED:
+        import verkx_snapshot
+        verkx_snapshot.clear_loaded()
 
+@diag.timed()
+def main_opperational_forecast(past_file, future_file, share_file, margin_2025=0.15, margin_2026=0.15, margin_2027=0.15, margin_2028=0.15,
+                               scenario=None):
+    params = {
+        "past_file": past_file,
+        "future_file": future_file,
+        "share_file": share_file,
+        "data_stamp": tuple(WorkbookCache._stamp(f) for f in (past_file, future_file, share_file)),
+        "margins": ((2025, margin_2025), (2026, margin_2026), (2027, margin_2027), (2028, margin_2028)),
+        "scenario": normalize(scenario) if scenario else '',
+    }
+    yearly_units, df_cost = OPERATIONAL_PIPELINE.run_many(["module_mix", "profit"], **params)
+    return yearly_units.copy(), df_cost.copy()
 
+OP_SIM_CHUNK_BYTES = 64 * 1024 * 1024
 
-def calculate_offer(modules, km_fra_thorlakshofn, eur_to_isk, markup=0.15, annual_sqm=2400, fixed_cost=34800000):
-    data = {
-        "3m": {"fm": 19.5, "verd_eur": 1800, "kg": 9750},
-        "2m": {"fm": 13, "verd_eur": 1950, "kg": 6500},
-        "1m": {"fm": 6.5, "verd_eur": 2050, "kg": 3250},
-        "0.5m": {"fm": 3.25, "verd_eur": 2175, "kg": 1625},
+def _region_cholesky(region_correlation, n_regions):
+    if region_correlation is None or np.isscalar(region_correlation) and region_correlation == 0:
+        return None
+    if np.isscalar(region_correlation):
+        corr = np.full((n_regions, n_regions), float(region_correlation))
+        np.fill_diagonal(corr, 1.0)
+    else:
+        corr = np.asarray(region_correlation, dtype=float)
+    return np.linalg.cholesky(corr)
+
+@diag.timed()
+def simulate_operational_forecast(past_file, future_file, share_file, margin_2025=0.15, margin_2026=0.15, margin_2027=0.15, margin_2028=0.15,
+                                  simulations=50000, volatility=0.1, region_correlation=0.0, seed=None, dtype=np.float64,
+                                  max_chunk_bytes=OP_SIM_CHUNK_BYTES, return_samples=False, scenario=None):
+    # Monte Carlo yfir allan rekstrarlíkanið: suð á eftirspurn (hermanir x húsnæði x landshluti x ár),
+    # mögulega fylgni milli landshluta, keyrt í gegnum einingaskiptingu, kostnað og verð sem fylkjareikningar.
+    # Verð á fermetra er ákveðið út frá ákvörðunarbundnu spánni (tekjur / fermetrar) en raunkostnaður
+    # fylgir hermdu magni, svo tap verður þegar magnið dugar ekki fyrir föstum kostnaði.
+    params = {
+        "past_file": past_file,
+        "future_file": future_file,
+        "share_file": share_file,
+        "data_stamp": tuple(WorkbookCache._stamp(f) for f in (past_file, future_file, share_file)),
+        "margins": ((2025, margin_2025), (2026, margin_2026), (2027, margin_2027), (2028, margin_2028)),
+        "scenario": normalize(scenario) if scenario else '',
     }
+    simulations = _check_simulations(simulations)
+    loaded, forecast, units, plan = OPERATIONAL_PIPELINE.run_many(["load", "series_forecast", "units", "profit"], **params)
+
+    housing = list(dict.fromkeys(h for h, _, _ in forecast["jobs"]))
+    regions = loaded["regions"]
+    h_idx = np.array([housing.index(h) for h, _, _ in forecast["jobs"]])
+    r_idx = np.array([regions.index(r) for _, r, _ in forecast["jobs"]])
+    factors = np.array([loaded["share_map"].get(r, 0) * _scenario_factor(scen) for _, r, scen in forecast["jobs"]])
+    base = forecast["base"]
+    n_years = base.shape[1]
+
+    mean_units = np.zeros((len(housing), len(regions), n_years))
+    noise_scale = np.zeros((len(housing), len(regions), 1))
+    np.add.at(mean_units, (h_idx, r_idx), base * factors[:, None])
+    np.add.at(noise_scale, (h_idx, r_idx), np.abs(base.mean(axis=1) * volatility * factors)[:, None])
+    mean_units = mean_units.astype(dtype)
+    noise_scale = noise_scale.astype(dtype)
+    chol = _region_cholesky(region_correlation, len(regions))
+
+    price_per_sqm = (plan['tekjur'] / units['heildarfermetrar']).to_numpy()
+    per_sim_bytes = mean_units.size * np.dtype(dtype).itemsize * 2
+    chunk_size = max(1, int(max_chunk_bytes // per_sim_bytes))
+    rng = np.random.default_rng(seed)
+
+    profits = np.empty((simulations, n_years))
+    for start in range(0, simulations, chunk_size):
+        n = min(chunk_size, simulations - start)
+        noise = rng.standard_normal((n,) + mean_units.shape, dtype=dtype)
+        if chol is not None:
+            # fylgni milli landshluta: z @ L^T eftir landshlutaás
+            noise = np.moveaxis(np.moveaxis(noise, 2, -1) @ chol.T.astype(dtype), -1, 2)
+        noise *= noise_scale
+        noise += mean_units
+        einingar = noise.sum(axis=(1, 2), dtype=np.float64)
+        heildarfermetrar = einingar * 6.5
+        costs = _operational_costs(heildarfermetrar, _module_units(heildarfermetrar))
+        profits[start:start + n] = price_per_sqm * heildarfermetrar - costs['heildarkostnaður']
+
+    quantiles = np.percentile(profits, MC_QUANTILES, axis=0)
+    summary = pd.DataFrame({'Ár': OPERATIONAL_YEARS})
+    for q, values in zip(MC_QUANTILES, quantiles):
+        summary[f'hagnaður P{q}'] = values
+    summary['meðalhagnaður'] = profits.mean(axis=0)
+    summary['líkur á tapi'] = (profits < 0).mean(axis=0)
+    if return_samples:
+        return summary, profits
+    return summary
+
+OFFER_MODULES = {
+    "3m": {"fm": 19.5, "verd_eur": 1800, "kg": 9750},
+    "2m": {"fm": 13, "verd_eur": 1950, "kg": 6500},
+    "1m": {"fm": 6.5, "verd_eur": 2050, "kg": 3250},
+    "0.5m": {"fm": 3.25, "verd_eur": 2175, "kg": 1625},
+}
+
+@diag.timed()
+def calculate_offer(modules, km_fra_thorlakshofn, eur_to_isk, markup=0.15, annual_sqm=2400, fixed_cost=34800000):
+    data = OFFER_MODULES
 
     einingar = {
         k: {
@@ -245,12 +1047,205 @@ def calculate_offer(modules, km_fra_thorlakshofn, eur_to_isk, markup=0.15, annua
         "dags": date.today()
     }
 
-def generate_offer_pdf(verkkaupi, stadsetning, result, language="Íslenska"):
-    pdf = FPDF()
+@diag.timed()
+def calculate_offers_bulk(modules, km_fra_thorlakshofn=None, eur_to_isk=None, markup=None, annual_sqm=2400, fixed_cost=34800000,
+                          allow_estimated=False):
+    # Sömu reikningar og calculate_offer, dálkvís yfir mörg tilboð í einu.
+    # modules er DataFrame með dálkum 3m/2m/1m/0.5m (og má innihalda km, eur_to_isk og markup; stadsetning
+    # eða breidd/lengd í stað km)
+    # eða fylki (n x 4) í sömu röð og OFFER_MODULES. Skilar DataFrame með einni línu á tilboð; km_aaetlad segir
+    # hvort vegalengd úr afhendingarstöðum sé áætluð (ekki úr verðskrá). Áætlaðar vegalengdir eru aðeins
+    # verðlagðar með allow_estimated=True, annars er ValueError kastað með línunúmerunum.
+    km_aaetlad = None
+    if isinstance(modules, pd.DataFrame):
+        df = modules.reset_index(drop=True)
+        counts = np.column_stack([
+            df[k].fillna(0).to_numpy(dtype=float) if k in df.columns else np.zeros(len(df))
+            for k in OFFER_MODULES
+        ])
+        if km_fra_thorlakshofn is None and any(c in df.columns for c in ('stadsetning', 'breidd', 'lengd')):
+            # Vegalengd úr afhendingarstöðum (verkx_delivery) þar sem km vantar
+            from verkx_delivery import get_delivery_index
+            km_fra_thorlakshofn, km_aaetlad = get_delivery_index().frame_resolve(df)
+            unknown = np.flatnonzero(np.isnan(km_fra_thorlakshofn))
+            if len(unknown):
+                raise ValueError(f"Vegalengd fannst ekki fyrir línur: {', '.join(str(i + 1) for i in unknown[:20])}.")
+            estimated = np.flatnonzero(km_aaetlad)
+            if len(estimated) and not allow_estimated:
+                raise ValueError(f"Vegalengd er áætluð (ekki úr verðskrá) fyrir línur: "
+                                 f"{', '.join(str(i + 1) for i in estimated[:20])}. Gefðu km eða leyfðu áætlaða vegalengd.")
+        elif km_fra_thorlakshofn is None and 'km' in df.columns:
+            km_fra_thorlakshofn = df['km'].to_numpy(dtype=float)
+        if eur_to_isk is None and 'eur_to_isk' in df.columns:
+            eur_to_isk = df['eur_to_isk'].to_numpy(dtype=float)
+        if markup is None and 'markup' in df.columns:
+            markup = df['markup'].to_numpy(dtype=float)
+    else:
+        counts = np.atleast_2d(np.asarray(modules, dtype=float))
+        df = pd.DataFrame(counts, columns=list(OFFER_MODULES))
+    if km_fra_thorlakshofn is None or eur_to_isk is None:
+        raise ValueError("km_fra_thorlakshofn og eur_to_isk vantar.")
+    n = len(counts)
+    km = np.broadcast_to(np.asarray(km_fra_thorlakshofn, dtype=float), (n,))
+    fx = np.broadcast_to(np.asarray(eur_to_isk, dtype=float), (n,))
+    markup = np.broadcast_to(np.asarray(0.15 if markup is None else markup, dtype=float), (n,))
+
+    fm = np.array([m["fm"] for m in OFFER_MODULES.values()])
+    verd_eur = np.array([m["verd_eur"] for m in OFFER_MODULES.values()])
+    kg = np.array([m["kg"] for m in OFFER_MODULES.values()])
+
+    # Summur eru teknar dálk fyrir dálk í sömu röð og í calculate_offer svo niðurstöður eru eins
+    heildarfm = np.zeros(n)
+    heildarthyngd = np.zeros(n)
+    for j in range(len(fm)):
+        heildarfm = heildarfm + counts[:, j] * fm[j]
+        heildarthyngd = heildarthyngd + counts[:, j] * kg[j]
+
+    afslattur = np.where(heildarfm >= 650, 0.10, 0.0)
+    afslattur = np.where(heildarfm >= 1300, np.minimum(0.18, 0.15 + ((heildarfm - 1300) // 325) * 0.01), afslattur)
+
+    einingakostnadur = np.zeros(n)
+    for j in range(len(fm)):
+        einingakostnadur = einingakostnadur + counts[:, j] * fm[j] * verd_eur[j] * fx * (1 - afslattur)
+
+    kostnadur_per_fm = np.divide(einingakostnadur, heildarfm, out=np.zeros(n), where=heildarfm != 0)
+    flutningskostn = heildarfm * 43424
+    sendingarkostn = heildarfm * km * 8
+    breytilegur = einingakostnadur + flutningskostn + sendingarkostn
+    fastur_kostn = np.where(heildarfm != 0, (heildarfm / annual_sqm) * fixed_cost, 0.0)
+    alagsstudull = np.where(breytilegur != 0, 1 + np.divide(fastur_kostn, breytilegur, out=np.zeros(n), where=breytilegur != 0), 0.0)
+    tilbod = breytilegur * alagsstudull * (1 + markup)
+    tilbod_eur = np.divide(tilbod, fx, out=np.zeros(n), where=fx != 0)
+
+    result = pd.DataFrame({
+        "heildarfm": heildarfm,
+        "heildarthyngd": heildarthyngd,
+        "afslattur": afslattur,
+        "heildarkostnadur_einingar": einingakostnadur,
+        "kostnadur_per_fm": kostnadur_per_fm,
+        "flutningur_til_islands": flutningskostn,
+        "sendingarkostnadur": sendingarkostn,
+        "samtals_breytilegur": breytilegur,
+        "uthlutadur_fastur_kostnadur": fastur_kostn,
+        "alagsstudull": alagsstudull,
+        "arðsemiskrafa": markup,
+        "tilbod": tilbod,
+        "tilbod_eur": tilbod_eur,
+    })
+    inputs = df.drop(columns=[c for c in result.columns if c in df.columns])
+    inputs = inputs.assign(km=km, eur_to_isk=fx)
+    if km_aaetlad is not None:
+        inputs = inputs.assign(km_aaetlad=km_aaetlad)
+    return pd.concat([inputs, result], axis=1)
+
+def offer_grid(max_units, km_map, eur_rates, markups):
+    # Allar einingasamsetningar með 1..max_units einingum x afhendingarstaðir x gengi x álagning
+    ranges = [np.arange(max_units + 1)] * len(OFFER_MODULES)
+    mixes = np.stack(np.meshgrid(*ranges, indexing='ij'), axis=-1).reshape(-1, len(OFFER_MODULES))
+    totals = mixes.sum(axis=1)
+    mixes = mixes[(totals > 0) & (totals <= max_units)]
+    places = [(name, km) for name, km in km_map.items() if km is not None]
+    n_mix, n_place, n_fx, n_markup = len(mixes), len(places), len(eur_rates), len(markups)
+    idx = np.indices((n_mix, n_place, n_fx, n_markup)).reshape(4, -1)
+    grid = pd.DataFrame(mixes[idx[0]], columns=list(OFFER_MODULES))
+    grid.insert(0, "stadsetning", [places[i][0] for i in idx[1]])
+    grid["km"] = np.array([km for _, km in places], dtype=float)[idx[1]]
+    grid["eur_to_isk"] = np.asarray(eur_rates, dtype=float)[idx[2]]
+    grid["markup"] = np.asarray(markups, dtype=float)[idx[3]]
+    return grid
+
+OFFER_FONT_FILE = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+OFFER_LOGO_FILE = "cubitlogo.png"
+# Stafir sem eru alltaf í undirmengi letursins; þá er undirmengið eins á milli tilboða og má endurnýta
+OFFER_CHARSET = ''.join(chr(c) for c in range(32, 127)) + "ÁÐÉÍÓÚÝÞÆÖáðéíóúýþæö€"
+PDF_SUBSET_CACHE_SIZE = 32
+# generate_offer_pdfs er kallað úr Streamlit þjóninum sem keyrir marga þræði; fork þaðan getur erft læsta
+# lása og afritar minni þjónsins, svo ferlin eru ræst með forkserver (spawn þar sem hann er ekki til)
+PDF_MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_PDF_RESOURCES = None
+_PDF_RESOURCES_LOCK = threading.Lock()
+
+def _offer_pdf_resources():
+    # Leturmælingar, lógó og undirmengun letursins eru reiknuð einu sinni í hverju ferli.
+    # fpdf 1.7.2 les TTF skrána aftur við hvert output(); CachedTTFontFile og OfferPDF geyma
+    # undirmengið og breiddatöfluna svo það gerist aðeins einu sinni fyrir hvert stafamengi.
+    # Aðeins OfferPDF notar CachedTTFontFile; fpdf einingunni sjálfri er ekki breytt.
+    global _PDF_RESOURCES
+    with _PDF_RESOURCES_LOCK:
+        if _PDF_RESOURCES is None:
+            import types
+            from fpdf import FPDF
+            from fpdf.ttfonts import TTFontFile
+
+            class CachedTTFontFile(TTFontFile):
+                subsets = {}
+
+                def makeSubset(self, file, subset):
+                    key = (file, tuple(sorted(set(subset))))
+                    cached = self.subsets.get(key)
+                    if cached is None:
+                        stream = TTFontFile.makeSubset(self, file, subset)
+                        cached = (stream, self.codeToGlyph, self.maxUni)
+                        if len(self.subsets) >= PDF_SUBSET_CACHE_SIZE:
+                            self.subsets.clear()
+                        self.subsets[key] = cached
+                    _, self.codeToGlyph, self.maxUni = cached
+                    return cached[0]
+
+            class OfferPDF(FPDF):
+                # /W breiddatafla letursins er reiknuð yfir alla stafi (~65 þús.) í hvert sinn; geymd hér
+                widths = {}
+                # FPDF._putfonts með TTFontFile -> CachedTTFontFile í sínu eigin nafnasvæði
+                _putfonts = types.FunctionType(FPDF._putfonts.__code__,
+                                               dict(FPDF._putfonts.__globals__, TTFontFile=CachedTTFontFile),
+                                               "_putfonts", FPDF._putfonts.__defaults__, FPDF._putfonts.__closure__)
+
+                def _putTTfontwidths(self, font, maxUni):
+                    key = (font['ttffile'], tuple(sorted(set(font['subset']))), maxUni)
+                    line = self.widths.get(key)
+                    if line is None:
+                        captured = []
+                        self._out = captured.append
+                        try:
+                            FPDF._putTTfontwidths(self, font, maxUni)
+                        finally:
+                            del self._out
+                        line = captured[0]
+                        if len(self.widths) >= PDF_SUBSET_CACHE_SIZE:
+                            self.widths.clear()
+                        self.widths[key] = line
+                    self._out(line)
+
+            pdf = OfferPDF()
+            pdf.add_page()
+            pdf.add_font('DejaVu', '', OFFER_FONT_FILE, uni=True)
+            pdf.image(OFFER_LOGO_FILE, x=10, y=8, w=30)
+            font = pdf.fonts['dejavu']
+            font['subset'] = font['subset'] + [ord(c) for c in OFFER_CHARSET]
+            _PDF_RESOURCES = {
+                'FPDF': OfferPDF,
+                'font': font,
+                'font_files': dict(pdf.font_files),
+                'logo': pdf.images[OFFER_LOGO_FILE],
+            }
+        return _PDF_RESOURCES
+
+def _new_offer_pdf():
+    resources = _offer_pdf_resources()
+    pdf = resources['FPDF']()
     pdf.add_page()
-    pdf.add_font('DejaVu', '', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', uni=True)
+    pdf.fonts['dejavu'] = dict(resources['font'], subset=list(resources['font']['subset']))
+    pdf.font_files.update(resources['font_files'])
+    pdf.images[OFFER_LOGO_FILE] = dict(resources['logo'])
+    return pdf
+
+@diag.timed()
+def generate_offer_pdf(verkkaupi, stadsetning, result, language="Íslenska"):
+    with diag.timer("generate_offer_pdf.resources"):
+        pdf = _new_offer_pdf()
     pdf.set_font('DejaVu', '', 12)
-    pdf.image("cubitlogo.png", x=10, y=8, w=30)
+    pdf.image(OFFER_LOGO_FILE, x=10, y=8, w=30)
 
     pdf.set_xy(50, 10)
     pdf.set_font('DejaVu', '', 16)
@@ -307,7 +1302,43 @@ def generate_offer_pdf(verkkaupi, stadsetning, result, language="Íslenska"):
     for label, value in labels[language]:
         pdf.cell(0, 10, f"{label}: {value}", ln=True)
 
-    return pdf.output(dest="S").encode("latin-1")
+    with diag.timer("generate_offer_pdf.output"):
+        return pdf.output(dest="S").encode("latin-1")
 
+def _render_offer_pdf(job):
+    return generate_offer_pdf(*job)
 
+def _offer_filename(i, verkkaupi):
+    ascii_name = unicodedata.normalize('NFKD', str(verkkaupi)).encode('ascii', 'ignore').decode('ascii')
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in ascii_name).strip('_')
+    return f"tilbod_{i:05d}_{safe}.pdf" if safe else f"tilbod_{i:05d}.pdf"
+
+def generate_offer_pdfs(offers, language="Íslenska", processes=None, chunksize=16):
+    # Mörg tilboð í eina zip skrá. offers er DataFrame úr calculate_offers_bulk
+    # (með dálkum verkkaupi/stadsetning ef til) eða listi af (verkkaupi, stadsetning, result).
+    if isinstance(offers, pd.DataFrame):
+        jobs = []
+        for row in offers.to_dict('records'):
+            verkkaupi = row.get('verkkaupi', '')
+            stadsetning = row.get('stadsetning', '')
+            jobs.append((
+                '' if pd.isna(verkkaupi) else str(verkkaupi),
+                '' if pd.isna(stadsetning) else str(stadsetning),
+                row,
+                language,
+            ))
+    else:
+        jobs = [(verkkaupi, stadsetning, result, language) for verkkaupi, stadsetning, result in offers]
 
+    processes = processes or os.cpu_count() or 1
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        if processes > 1 and len(jobs) > chunksize:
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context(PDF_MP_START_METHOD),
+                                     initializer=_offer_pdf_resources) as pool:
+                pdfs = list(pool.map(_render_offer_pdf, jobs, chunksize=chunksize))
+        else:
+            pdfs = map(_render_offer_pdf, jobs)
+        for i, (job, pdf_bytes) in enumerate(zip(jobs, pdfs), 1):
+            zf.writestr(_offer_filename(i, job[0]), pdf_bytes)
+    return buffer.getvalue()
@@ -0,0 +1,152 @@
+# Afhendingarstaðir og vegalengd frá Þorlákshöfn fyrir sendingarkostnað tilboða.
+# data/afhendingarstadir.csv er lesin einu sinni í fylki: heiti, samheiti og póstnúmer vísa á línu í gegnum
+# eina uppflettitöflu (stöðluð með normalize) og hnit eru notuð til að finna næsta stað. km er vegalengdin úr
+# verðskránni; þar sem hana vantar er hún áætluð út frá loftlínu og hlutfalli vegar/loftlínu næsta staðar sem
+# hefur km (DeliveryIndex.estimated segir til um það). Áætlaðir staðir eru ekki í valmyndinni (table) og
+# uppflettingar segja til um hvort vegalengdin sé áætluð (resolve, frame_resolve).
+import threading
+
+import numpy as np
+import pandas as pd
+
+import verkx_code as vk
+
+DELIVERY_FILE = "data/afhendingarstadir.csv"
+DELIVERY_ORIGIN = "Þorlákshöfn"
+DELIVERY_CHUNK = 4096
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Loftlína í km; útvarpast eins og numpy fylki
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _key(value):
+    # Póstnúmer "800", 800 og 800.0 verða sami lykill
+    if isinstance(value, (int, np.integer)) or (isinstance(value, (float, np.floating)) and float(value).is_integer()):
+        return str(int(value))
+    return vk.normalize(value)
+
+
+class DeliveryIndex:
+    def __init__(self, file_path=DELIVERY_FILE, origin=DELIVERY_ORIGIN):
+        self.file_path = file_path
+        self.stamp = vk.WorkbookCache._stamp(file_path)
+        df = pd.read_csv(file_path, dtype={"postnumer": str, "samheiti": str, "enska": str}, keep_default_na=False,
+                         na_values={"km": [""], "breidd": [""], "lengd": [""]})
+        self.names = df["stadur"].to_numpy(dtype=object)
+        self.english = np.where(df["enska"] != "", df["enska"], df["stadur"]).astype(object)
+        self.lat = df["breidd"].to_numpy(dtype=float)
+        self.lon = df["lengd"].to_numpy(dtype=float)
+        self.keys = {}
+        for i, row in enumerate(df.itertuples(index=False)):
+            for value in [row.stadur, row.enska] + row.samheiti.split("|") + row.postnumer.split("|"):
+                if value:
+                    self.keys.setdefault(_key(value), i)
+        origin_row = self.keys.get(_key(origin))
+        if origin_row is None:
+            raise ValueError(f"'{origin}' fannst ekki í {file_path}.")
+        self.origin = (self.lat[origin_row], self.lon[origin_row])
+        km = df["km"].to_numpy(dtype=float, copy=True)
+        self.estimated = np.isnan(km)
+        crow = haversine_km(self.origin[0], self.origin[1], self.lat, self.lon)
+        known = np.flatnonzero(~self.estimated & (crow > 0))
+        if self.estimated.any() and len(known):
+            # Hlutfall vegar og loftlínu frá næsta stað með þekkta vegalengd
+            nearest = known[np.argmin(haversine_km(self.lat[self.estimated, None], self.lon[self.estimated, None],
+                                                   self.lat[None, known], self.lon[None, known]), axis=1)]
+            km[self.estimated] = np.round(crow[self.estimated] * km[nearest] / crow[nearest])
+        self.km = km
+
+    def is_stale(self):
+        return vk.WorkbookCache._stamp(self.file_path) != self.stamp
+
+    def table(self, language="Íslenska"):
+        # {heiti: km} í röð skrárinnar, t.d. fyrir valmynd; aðeins staðir með km úr verðskránni
+        names = self.names if language == "Íslenska" else self.english
+        known = ~self.estimated
+        return dict(zip(names[known].tolist(), self.km[known].tolist()))
+
+    def lookup(self, places):
+        # Línunúmer fyrir heiti/samheiti/póstnúmer, -1 ef ekki fannst. Hvert ólíkt gildi er staðlað einu sinni.
+        values = pd.Series(np.atleast_1d(np.asarray(places, dtype=object)))
+        codes, uniques = pd.factorize(values)
+        rows = np.array([-1 if pd.isna(u) or str(u).strip() == "" else self.keys.get(_key(u), -1) for u in uniques],
+                        dtype=np.int64)
+        out = np.full(len(values), -1, dtype=np.int64)
+        found = codes >= 0
+        out[found] = rows[codes[found]]
+        return out
+
+    def nearest(self, lat, lon, chunk=DELIVERY_CHUNK):
+        # Næsti staður (línunúmer) og loftlína að honum fyrir hvert hnit, í bútum af `chunk` hnitum
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        rows = np.full(len(lat), -1, dtype=np.int64)
+        dist = np.full(len(lat), np.nan)
+        valid = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        for start in range(0, len(valid), chunk):
+            idx = valid[start:start + chunk]
+            d = haversine_km(lat[idx, None], lon[idx, None], self.lat[None, :], self.lon[None, :])
+            best = np.argmin(d, axis=1)
+            rows[idx] = best
+            dist[idx] = d[np.arange(len(idx)), best]
+        return rows, dist
+
+    def resolve(self, places=None, lat=None, lon=None):
+        # (km, áætlað) frá Þorlákshöfn: fyrst eftir heiti/póstnúmeri, annars næsti staður við hnitin að viðbættri
+        # loftlínu þangað (sinnum hlutfall vegar/loftlínu þess staðar). NaN ef hvorugt finnst. áætlað er True
+        # þar sem km er ekki úr verðskránni, þ.e. áætlaður staður eða út frá hnitum.
+        n = len(np.atleast_1d(places if places is not None else lat))
+        km = np.full(n, np.nan)
+        estimated = np.zeros(n, dtype=bool)
+        if places is not None:
+            rows = self.lookup(places)
+            km[rows >= 0] = self.km[rows[rows >= 0]]
+            estimated[rows >= 0] = self.estimated[rows[rows >= 0]]
+        if lat is not None and lon is not None:
+            missing = np.flatnonzero(np.isnan(km))
+            if len(missing):
+                lat = np.broadcast_to(np.asarray(lat, dtype=float), (n,))[missing]
+                lon = np.broadcast_to(np.asarray(lon, dtype=float), (n,))[missing]
+                rows, dist = self.nearest(lat, lon)
+                ok = rows >= 0
+                crow = haversine_km(self.origin[0], self.origin[1], self.lat[rows[ok]], self.lon[rows[ok]])
+                ratio = np.divide(self.km[rows[ok]], crow, out=np.ones(ok.sum()), where=crow > 0)
+                km[missing[ok]] = self.km[rows[ok]] + dist[ok] * np.maximum(ratio, 1.0)
+                estimated[missing[ok]] = True
+        return km, estimated
+
+    def distance_km(self, places=None, lat=None, lon=None):
+        return self.resolve(places, lat, lon)[0]
+
+    def frame_resolve(self, df):
+        # (km, áætlað) fyrir DataFrame: 'km' ef gefið, annars 'stadsetning' (heiti eða póstnúmer) eða 'breidd'/'lengd'
+        km = df["km"].to_numpy(dtype=float).copy() if "km" in df.columns else np.full(len(df), np.nan)
+        estimated = np.zeros(len(df), dtype=bool)
+        missing = np.isnan(km)
+        if missing.any():
+            places = df["stadsetning"].to_numpy(dtype=object)[missing] if "stadsetning" in df.columns else None
+            lat = df["breidd"].to_numpy(dtype=float)[missing] if "breidd" in df.columns else None
+            lon = df["lengd"].to_numpy(dtype=float)[missing] if "lengd" in df.columns else None
+            if places is not None or lat is not None:
+                km[missing], estimated[missing] = self.resolve(places, lat, lon)
+        return km, estimated
+
+    def frame_km(self, df):
+        return self.frame_resolve(df)[0]
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_delivery_index(file_path=DELIVERY_FILE):
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.file_path != file_path or _INDEX.is_stale():
+            _INDEX = DeliveryIndex(file_path)
+        return _INDEX
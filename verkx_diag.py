@@ -0,0 +1,197 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+DIAGNOSTICS_ENABLED = os.environ.get("VERKX_DIAGNOSTICS", "") not in ("", "0")
+DIAGNOSTICS_MAX_EVENTS = 500
+
+logger = logging.getLogger("verkx.diag")
+
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("diag", "name", "start")
+
+    def __init__(self, diag, name):
+        self.diag = diag
+        self.name = name
+
+    def __enter__(self):
+        self.diag._stack().append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        stack = self.diag._stack()
+        stack.pop()
+        self.diag.record(self.name, seconds, parent=stack[-1] if stack else None, failed=exc[0] is not None)
+        return False
+
+
+class DiagnosticsStore:
+    # Safnarar fyrir tímamæla, teljara og nýlegar mælingar. Diagnostics á einn fyrir allt ferlið; Streamlit lota
+    # getur átt sinn eigin (geymdur í st.session_state) og virkjað hann með use_local() svo spjaldið sýni
+    # aðeins mælingar þeirrar lotu.
+    def __init__(self, max_events=DIAGNOSTICS_MAX_EVENTS):
+        self.timers = {}
+        self.counters = {}
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+
+
+class Diagnostics:
+    # Tímamælar og teljarar fyrir heitu slóðirnar. Þegar slökkt er skilar timer() sameiginlegu
+    # tómu samhengi og count() snýr strax til baka, svo kostnaðurinn er ein contextvar uppfletting.
+    # enabled er sjálfgefna stillingin fyrir ferlið (VERKX_DIAGNOSTICS); enable_local() stillir hana aðeins
+    # fyrir núverandi samhengi, t.d. eina Streamlit lotu, án þess að hafa áhrif á aðrar lotur.
+    def __init__(self, enabled=DIAGNOSTICS_ENABLED, max_events=DIAGNOSTICS_MAX_EVENTS):
+        self.enabled = enabled
+        self._local_enabled = contextvars.ContextVar(f"verkx_diag_enabled_{id(self)}", default=None)
+        self._local_store = contextvars.ContextVar(f"verkx_diag_store_{id(self)}", default=None)
+        self.store = DiagnosticsStore(max_events)
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def enable_local(self, enabled=True):
+        # None fellur aftur á stillingu ferlisins
+        self._local_enabled.set(enabled)
+
+    def use_local(self, store):
+        # Mælingar í núverandi samhengi fara í store í stað sameiginlega safnarans; None fellur aftur á hann
+        self._local_store.set(store)
+
+    @property
+    def current(self):
+        local = self._local_store.get()
+        return self.store if local is None else local
+
+    @property
+    def active(self):
+        local = self._local_enabled.get()
+        return self.enabled if local is None else local
+
+    def timer(self, name):
+        if not self.active:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name=None):
+        def decorate(fn):
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.active:
+                    return fn(*args, **kwargs)
+                with _Timer(self, label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, name, seconds, **fields):
+        # Skráir eina mælingu (líka notað beint þar sem tíminn er þegar mældur, t.d. í StagedPipeline)
+        if not self.active:
+            return
+        event = {"name": name, "seconds": seconds, "time": time.time(), "thread": threading.current_thread().name}
+        event.update(fields)
+        store = self.current
+        with store.lock:
+            t = store.timers.get(name)
+            if t is None:
+                t = store.timers[name] = {"calls": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0}
+            t["calls"] += 1
+            t["total_s"] += seconds
+            t["max_s"] = max(t["max_s"], seconds)
+            t["last_s"] = seconds
+            store.events.append(event)
+        logger.debug("%s %.6f s", name, seconds, extra={"diag": event})
+
+    def count(self, name, n=1):
+        if not self.active:
+            return
+        store = self.current
+        with store.lock:
+            store.counters[name] = store.counters.get(name, 0) + n
+        logger.debug("%s +%d", name, n, extra={"diag": {"name": name, "count": n, "time": time.time()}})
+
+    def snapshot(self):
+        # Mælingar safnarans í núverandi samhengi; "local" segir hvort þær eru aðeins þessarar lotu
+        store = self.current
+        with store.lock:
+            timers = {
+                name: dict(t, mean_s=t["total_s"] / t["calls"])
+                for name, t in store.timers.items()
+            }
+            return {"enabled": self.active, "local": store is not self.store, "timers": timers,
+                    "counters": dict(store.counters)}
+
+    def recent_events(self, limit=50):
+        store = self.current
+        with store.lock:
+            return list(store.events)[-limit:]
+
+    def reset(self):
+        store = self.current
+        with store.lock:
+            store.timers.clear()
+            store.counters.clear()
+            store.events.clear()
+
+    @contextmanager
+    def profile(self, sort="cumulative", limit=40):
+        # cProfile fyrir eina beiðni; niðurstaðan (texti) er sett í result["stats"] þegar blokkinni lýkur
+        result = {"stats": None, "seconds": None}
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result["seconds"] = time.perf_counter() - start
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+            result["stats"] = out.getvalue()
+
+
+class JsonFormatter(logging.Formatter):
+    # Ein JSON lína á mælingu, t.d. logging.FileHandler("diag.jsonl") með þessum formatter
+    def format(self, record):
+        payload = getattr(record, "diag", None)
+        if payload is None:
+            payload = {"name": record.name, "message": record.getMessage()}
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+DIAGNOSTICS = Diagnostics()
+
+enable = DIAGNOSTICS.enable
+enable_local = DIAGNOSTICS.enable_local
+use_local = DIAGNOSTICS.use_local
+timer = DIAGNOSTICS.timer
+timed = DIAGNOSTICS.timed
+record = DIAGNOSTICS.record
+count = DIAGNOSTICS.count
+snapshot = DIAGNOSTICS.snapshot
+recent_events = DIAGNOSTICS.recent_events
+reset = DIAGNOSTICS.reset
+profile = DIAGNOSTICS.profile
@@ -0,0 +1,133 @@
+# Útflutningur niðurstaðna: mörg blöð í einni xlsx skrá (openpyxl write-only) eða Parquet skrár.
+# Tafla getur verið DataFrame, listi/gjafi af DataFrame bútum eða fall sem skilar slíkum gjafa;
+# bútarnir eru skrifaðir jafnóðum svo minnisnotkun ræðst af stærsta bútnum, ekki allri skýrslunni.
+import os
+import tempfile
+from datetime import date, datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import verkx_code as vk
+
+EXPORT_CHUNK_ROWS = 10000
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def iter_frames(table, chunk_rows=EXPORT_CHUNK_ROWS):
+    if callable(table):
+        table = table()
+    if isinstance(table, pd.DataFrame):
+        for start in range(0, max(len(table), 1), chunk_rows):
+            yield table.iloc[start:start + chunk_rows]
+        return
+    for frame in table:
+        yield frame
+
+
+def _cell(value):
+    # numpy gildi í Python gildi sem openpyxl skilur; NaN verður tómur reitur
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, (str, int, date, datetime)):
+        return value
+    return str(value)
+
+
+def write_xlsx(sheets, target=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    # sheets: listi af (heiti blaðs, tafla) eða dict. target: slóð eða skráarhlutur; None skilar bætum.
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for name, table in (sheets.items() if isinstance(sheets, dict) else sheets):
+        ws = wb.create_sheet(str(name)[:31])
+        header = None
+        for frame in iter_frames(table, chunk_rows):
+            if header is None:
+                header = [str(c) for c in frame.columns]
+                ws.append(header)
+            for row in frame.itertuples(index=False, name=None):
+                ws.append([_cell(v) for v in row])
+    if target is None:
+        buffer = BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+    wb.save(target)
+    return target
+
+
+def write_parquet(sheets, out_dir, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Ein Parquet skrá á töflu; hver bútur verður sér row group. Skilar {heiti: slóð}.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet úttak krefst pyarrow (pip install pyarrow); annars má nota --format csv eða xlsx.") from e
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, table in (sheets.items() if isinstance(sheets, dict) else sheets):
+        path = os.path.join(out_dir, f"{name}.parquet")
+        writer = None
+        try:
+            for frame in iter_frames(table, chunk_rows):
+                batch = pa.Table.from_pandas(frame.rename(columns=str), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema)
+                writer.write_table(batch.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        paths[name] = path
+    return paths
+
+
+def xlsx_file(sheets, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Skrifar skýrsluna í tímabundna skrá á disk og skilar henni opinni í byrjun (t.d. fyrir st.download_button)
+    f = tempfile.TemporaryFile()
+    write_xlsx(sheets, f, chunk_rows)
+    f.seek(0)
+    return f
+
+
+def report_sheets(past_file=vk.PAST_FILE, future_file=vk.FUTURE_FILE, share_file=vk.SHARE_FILE, margins=(0.15,) * 4,
+                  scenario=None, future_years=5, market_share=0.5, seed=0, tolerance=vk.MC_TOLERANCE, sampling="lhs",
+                  operational=None):
+    # Skýrsla fyrir fjármál: einingar, kostnaður, eftirspurnarspá allra (húsnæði, landshluti) para og
+    # hlutfallsmörk hermana. Eftirspurnarspáin er reiknuð jafnóðum og blaðið er skrifað, einn landshluti í einu;
+    # hlutfallsmörkin (3 línur á röð) safnast upp á meðan og eru skrifuð á eftir.
+    # operational=(df_units, df_cost) notar þegar reiknaða rekstrarspá.
+    if operational is None:
+        operational = vk.main_opperational_forecast(past_file, future_file, share_file, *margins, scenario=scenario)
+    df_units, df_cost = operational
+    quantiles = []
+
+    def demand():
+        store = vk.get_demand_store(past_file, future_file)
+        pairs = [(h, r) for h in store.housing['past'] for r in store.regions('past', h)]
+        for i, (housing, region) in enumerate(pairs):
+            try:
+                df, summaries, _ = vk.main_forecast(housing, region, future_years, market_share, seed=[seed, i],
+                                                    past_file=past_file, future_file=future_file,
+                                                    tolerance=tolerance, sampling=sampling)
+            except ValueError:
+                continue
+            keys = {"Húsnæði": housing, "Landshluti": region}
+            for s in summaries:
+                quantiles.append(dict(keys, Hermun=s["title"], Hermanir=s["simulations"], Meðaltal=s["mean"], **s["quantiles"]))
+            yield df.melt(id_vars="Ár", var_name="Röð", value_name="Einingar").assign(**keys)[
+                ["Húsnæði", "Landshluti", "Ár", "Röð", "Einingar"]]
+
+    return [
+        ("Einingar", df_units),
+        ("Kostnaður", df_cost),
+        ("Eftirspurnarspá", demand),
+        ("Hermun", lambda: [pd.DataFrame(quantiles)]),
+    ]
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+
+FX_URL = os.environ.get("VERKX_FX_URL", "https://api.frankfurter.app/latest?from=EUR&to=ISK")
+FX_CACHE_FILE = os.path.join(os.environ.get("VERKX_CACHE_DIR", ".cache"), "eur_isk.json")
+FALLBACK_RATE = 146
+FX_TTL = 3600
+FX_RETRY_INTERVAL = 60
+
+
+class ExchangeRateProvider:
+    # EUR->ISK gengi sem UI-þráðurinn bíður aldrei eftir.
+    # rate() skilar alltaf strax: nýju gengi úr minni, síðasta þekkta gengi af disk eða FALLBACK_RATE,
+    # og setur af stað uppfærslu í bakgrunni ef gildið er eldra en ttl.
+    def __init__(self, url=FX_URL, ttl=FX_TTL, cache_file=FX_CACHE_FILE, timeout=5, fallback=FALLBACK_RATE,
+                 retry_interval=FX_RETRY_INTERVAL):
+        self.url = url
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._session = None
+        self._refreshing = None
+        self._last_attempt = None
+        self._rate = None
+        self._fetched_at = None
+        self._source = "fallback"
+        self.last_error = None
+        self._load_disk()
+
+    def _load_disk(self):
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                saved = json.load(f)
+            self._rate = float(saved["rate"])
+            self._fetched_at = float(saved["fetched_at"])
+            self._source = "cache"
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_disk(self, rate, fetched_at):
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rate": rate, "fetched_at": fetched_at, "url": self.url}, f)
+        os.replace(tmp, self.cache_file)
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def _fetch(self):
+        try:
+            response = self._get_session().get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            rate = float(response.json()["rates"]["ISK"])
+            fetched_at = time.time()
+            with self._lock:
+                self._rate = rate
+                self._fetched_at = fetched_at
+                self._source = "live"
+                self.last_error = None
+            try:
+                self._save_disk(rate, fetched_at)
+            except OSError:
+                pass
+        except Exception as e:
+            with self._lock:
+                self.last_error = repr(e)
+        finally:
+            with self._lock:
+                self._refreshing = None
+
+    def refresh(self, wait=False):
+        # Aðeins ein uppfærsla í gangi í einu; wait=True bíður eftir henni (t.d. í skriftum)
+        with self._lock:
+            thread = self._refreshing
+            if thread is None:
+                self._last_attempt = time.time()
+                thread = threading.Thread(target=self._fetch, name="verkx-fx-refresh", daemon=True)
+                self._refreshing = thread
+                thread.start()
+        if wait:
+            thread.join(self.timeout + 1)
+        return thread
+
+    def is_stale(self):
+        return self._fetched_at is None or time.time() - self._fetched_at > self.ttl
+
+    def rate_source(self):
+        # (gengi, uppruni) þar sem uppruni er "live", "cache" (af disk) eða "fallback".
+        # Eftir misheppnaða uppfærslu er beðið í retry_interval áður en reynt er aftur
+        retry_due = self._last_attempt is None or time.time() - self._last_attempt > self.retry_interval
+        if self.is_stale() and retry_due:
+            self.refresh()
+        with self._lock:
+            if self._rate is None:
+                return self.fallback, "fallback"
+            return self._rate, self._source
+
+    def rate(self):
+        return self.rate_source()[0]
+
+    def info(self):
+        rate, source = self.rate_source()
+        with self._lock:
+            age = None if self._fetched_at is None else time.time() - self._fetched_at
+            return {
+                "rate": rate,
+                "source": source,
+                "fetched_at": self._fetched_at,
+                "age_seconds": age,
+                "refreshing": self._refreshing is not None,
+                "last_error": self.last_error,
+            }
+
+
+_PROVIDER = None
+_PROVIDER_LOCK = threading.Lock()
+
+
+def get_exchange_rate_provider():
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        if _PROVIDER is None:
+            _PROVIDER = ExchangeRateProvider()
+        return _PROVIDER
+
+
+def eur_to_isk():
+    return get_exchange_rate_provider().rate()
@@ -0,0 +1,348 @@
+# Lítil staðbundin JSON þjónusta fyrir tilboð (t.d. fyrir CRM):
+#   GET  /health   staða, gengi og biðraðir
+#   POST /quote    {"modules": {"3m": 2, "2m": 4}, "km": 60, "markup": 0.15, "eur_to_isk": 146} -> niðurstaða calculate_offer
+#                  í stað "km" má senda "stadsetning" (staður eða póstnúmer) eða "breidd"/"lengd"; svarið segir
+#                  með "km_aaetlad" hvort vegalengdin sé áætluð en ekki úr verðskrá (haus X-Km-Aaetlad fyrir /pdf);
+#                  áætluð vegalengd er aðeins verðlögð með "allow_estimated": true. Hvert svar hefur "eur_to_isk"
+#                  og "fx_source" (request, live, cache eða fallback; hausar X-Eur-To-Isk/X-Fx-Source fyrir /pdf)
+#   POST /quotes   {"offers": [...]} -> listi af niðurstöðum (reiknað í einu með calculate_offers_bulk)
+#   POST /pdf      sama og /quote auk "verkkaupi", "stadsetning", "language" -> application/pdf
+#
+#   python verkx_service.py --port 8765
+#   python verkx_service.py --result-store    PDF tilboð geymd í .cache/results þvert á endurræsingar
+import argparse
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import verkx_code as vk
+from verkx_delivery import get_delivery_index
+from verkx_fx import get_exchange_rate_provider
+from verkx_store import get_result_store
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_MAX_BATCH = 256
+SERVICE_PDF_WORKERS = min(4, os.cpu_count() or 1)
+SERVICE_MAX_PENDING_PDF = 64
+SERVICE_MAX_BODY = 1024 * 1024
+SERVICE_BACKLOG = 128
+
+OFFER_RESULT_KEYS = (
+    "heildarfm", "heildarthyngd", "afslattur", "heildarkostnadur_einingar", "kostnadur_per_fm",
+    "flutningur_til_islands", "sendingarkostnadur", "samtals_breytilegur", "uthlutadur_fastur_kostnadur",
+    "alagsstudull", "arðsemiskrafa", "tilbod", "tilbod_eur",
+)
+
+
+class RequestError(ValueError):
+    pass
+
+
+def delivery_km(payload):
+    # (km, áætlað): "km" ef gefið, annars vegalengd eftir "stadsetning" (staður eða póstnúmer) eða "breidd"/"lengd"
+    if payload.get("km") is not None:
+        return float(payload["km"]), False
+    place = payload.get("stadsetning")
+    lat, lon = payload.get("breidd"), payload.get("lengd")
+    if place in (None, "") and (lat is None or lon is None):
+        raise RequestError("'km', 'stadsetning' eða 'breidd'/'lengd' vantar.")
+    km, estimated = get_delivery_index().resolve(None if place in (None, "") else [place],
+                                                 None if lat is None else [float(lat)], None if lon is None else [float(lon)])
+    if np.isnan(km[0]):
+        raise RequestError(f"Afhendingarstaður fannst ekki: {place}.")
+    if estimated[0] and payload.get("allow_estimated") is not True:
+        raise RequestError(f"Vegalengd til {place or 'hnitanna'} er áætluð (ekki úr verðskrá); sendu 'km' "
+                           "eða 'allow_estimated': true.")
+    return float(km[0]), bool(estimated[0])
+
+
+def parse_offer(payload, default_fx):
+    # Skilar (fjöldi eininga í röð OFFER_MODULES, km, gengi, álagning, lýsigögn) eða kastar RequestError.
+    # default_fx er (gengi, uppruni) úr ExchangeRateProvider.rate_source(); lýsigögnin fara óbreytt í svarið.
+    if not isinstance(payload, dict):
+        raise RequestError("Tilboð þarf að vera JSON hlutur.")
+    modules = payload.get("modules")
+    if not isinstance(modules, dict):
+        raise RequestError("'modules' vantar.")
+    unknown = set(modules) - set(vk.OFFER_MODULES)
+    if unknown:
+        raise RequestError(f"Óþekktar einingar: {', '.join(sorted(unknown))}.")
+    try:
+        counts = [float(modules.get(k, 0) or 0) for k in vk.OFFER_MODULES]
+        km, km_estimated = delivery_km(payload)
+        eur_to_isk, fx_source = (float(payload["eur_to_isk"]), "request") if payload.get("eur_to_isk") else default_fx
+        markup = float(payload.get("markup", 0.15))
+    except RequestError:
+        raise
+    except (TypeError, ValueError):
+        raise RequestError("Ógild tala í tilboði.")
+    if min(counts) < 0 or km < 0 or eur_to_isk <= 0:
+        raise RequestError("Gildi mega ekki vera neikvæð.")
+    if not any(counts):
+        raise RequestError("Engar einingar valdar.")
+    meta = {"km": km, "km_aaetlad": km_estimated, "eur_to_isk": eur_to_isk, "fx_source": fx_source}
+    return counts, km, eur_to_isk, markup, meta
+
+
+def offer_json(result, meta):
+    out = {k: float(result[k]) for k in OFFER_RESULT_KEYS}
+    out["dags"] = result.get("dags", date.today()).isoformat()
+    out.update(meta)
+    return out
+
+
+class QuoteBatcher:
+    # Sameinar tilboðsbeiðnir sem berast samtímis í eina calculate_offers_bulk keyrslu.
+    # Engin bið er innbyggð: einn þráður tekur fyrstu beiðnina og allt sem þegar bíður í röðinni
+    # (allt að max_batch), svo undir litlu álagi fer hver beiðni strax í gegnum calculate_offer.
+    def __init__(self, max_batch=SERVICE_MAX_BATCH):
+        self.max_batch = max_batch
+        self.batches = 0
+        self.quotes = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="verkx-quote-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, offer):
+        future = Future()
+        self._queue.put((offer, future))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = evaluate_offers([offer for offer, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.quotes += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "quotes": self.quotes,
+            "largest_batch": self.largest_batch,
+            "mean_batch": self.quotes / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+def evaluate_offers(offers):
+    if len(offers) == 1:
+        counts, km, eur_to_isk, markup, meta = offers[0]
+        return [offer_json(vk.calculate_offer(dict(zip(vk.OFFER_MODULES, counts)), km, eur_to_isk, markup), meta)]
+    counts, km, eur_to_isk, markup, meta = zip(*offers)
+    df = vk.calculate_offers_bulk(np.array(counts), np.array(km), np.array(eur_to_isk), np.array(markup))
+    today = date.today().isoformat()
+    columns = {k: df[k].to_numpy().tolist() for k in OFFER_RESULT_KEYS}
+    return [dict({k: columns[k][i] for k in OFFER_RESULT_KEYS}, dags=today, **meta[i]) for i in range(len(offers))]
+
+
+def _warm_pdf_worker():
+    vk._offer_pdf_resources()
+
+
+def _render_pdf(job):
+    verkkaupi, stadsetning, counts, km, eur_to_isk, markup, language = job
+    result = vk.calculate_offer(dict(zip(vk.OFFER_MODULES, counts)), km, eur_to_isk, markup)
+    return vk.generate_offer_pdf(verkkaupi, stadsetning, result, language)
+
+
+class QuoteService:
+    def __init__(self, pdf_workers=SERVICE_PDF_WORKERS, max_pending_pdf=SERVICE_MAX_PENDING_PDF, max_batch=SERVICE_MAX_BATCH,
+                 result_store=False):
+        # PDF ferlin eru ræst áður en nokkur þráður fer af stað (gengisuppfærsla, batcher)
+        # og hvert þeirra hleður leturgerð og merki einu sinni í initializer
+        self.pdf_workers = pdf_workers
+        self.max_pending_pdf = max_pending_pdf
+        self._pdf_slots = threading.BoundedSemaphore(max_pending_pdf)
+        self.pdf_rejected = 0
+        self.pdf_pool = None
+        if pdf_workers > 0:
+            self.pdf_pool = ProcessPoolExecutor(max_workers=pdf_workers, initializer=_warm_pdf_worker)
+            for f in [self.pdf_pool.submit(_warm_pdf_worker) for _ in range(pdf_workers)]:
+                f.result()
+        _warm_pdf_worker()
+        get_delivery_index()
+        # Tilboð sjálf eru ódýrari en uppfletting á disk; aðeins PDF skjöl fara í niðurstöðugeymsluna
+        self.store = get_result_store() if result_store else None
+        # Beðið eftir gengi við ræsingu (í mesta lagi fx.timeout) svo fyrstu tilboðin fái ekki FALLBACK_RATE
+        # þegar ekkert gengi er vistað; hvert svar segir hvaða gengi og uppruni var notaður (fx_source)
+        self.fx = get_exchange_rate_provider()
+        if self.fx.is_stale():
+            self.fx.refresh(wait=True)
+        self.batcher = QuoteBatcher(max_batch)
+        self.started = time.time()
+
+    def quote(self, payload):
+        return self.batcher.submit(parse_offer(payload, self.fx.rate_source())).result()
+
+    def quotes(self, payload):
+        offers = payload.get("offers") if isinstance(payload, dict) else payload
+        if not isinstance(offers, list) or not offers:
+            raise RequestError("'offers' þarf að vera listi.")
+        fx = self.fx.rate_source()
+        return evaluate_offers([parse_offer(offer, fx) for offer in offers])
+
+    def pdf(self, payload):
+        # Skilar (pdf, lýsigögn); pdf er None ef of margar beiðnir eru í vinnslu
+        counts, km, eur_to_isk, markup, meta = parse_offer(payload, self.fx.rate_source())
+        language = payload.get("language", "Íslenska")
+        if language not in ("Íslenska", "English"):
+            raise RequestError("'language' er Íslenska eða English.")
+        job = (str(payload.get("verkkaupi", "")), str(payload.get("stadsetning", "")), counts, km, eur_to_isk, markup, language)
+        key = None
+        if self.store is not None:
+            # Dagsetning tilboðsins er prentuð í skjalið
+            key = self.store.key(_render_pdf, (job,), extra=date.today().isoformat())
+            found, pdf = self.store.get(key)
+            if found:
+                return pdf, meta
+        if not self._pdf_slots.acquire(blocking=False):
+            self.pdf_rejected += 1
+            return None, meta
+        try:
+            if self.pdf_pool is None:
+                pdf = _render_pdf(job)
+            else:
+                pdf = self.pdf_pool.submit(_render_pdf, job).result()
+        finally:
+            self._pdf_slots.release()
+        if key is not None:
+            self.store.put(key, "verkx_service._render_pdf", pdf)
+        return pdf, meta
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime_seconds": time.time() - self.started,
+            "fx": self.fx.info(),
+            "batcher": self.batcher.stats(),
+            "pdf": {"workers": self.pdf_workers, "max_pending": self.max_pending_pdf, "rejected": self.pdf_rejected},
+            "result_store": self.store.stats() if self.store is not None else None,
+        }
+
+    def close(self):
+        if self.pdf_pool is not None:
+            self.pdf_pool.shutdown()
+
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Haus og meginmál eru skrifuð í tveimur köllum; án TCP_NODELAY bætir Nagle + seinkað ACK ~40 ms við hvert svar
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if content_type == "application/json":
+            body = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _payload(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > SERVICE_MAX_BODY:
+            raise RequestError("Beiðni of stór.")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise RequestError("Ógilt JSON.")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.service.health())
+        else:
+            self._send(404, {"error": "Fannst ekki."})
+
+    def do_POST(self):
+        try:
+            payload = self._payload()
+            if self.path == "/quote":
+                self._send(200, self.service.quote(payload))
+            elif self.path == "/quotes":
+                self._send(200, {"offers": self.service.quotes(payload)})
+            elif self.path == "/pdf":
+                pdf, meta = self.service.pdf(payload)
+                if pdf is None:
+                    self._send(503, {"error": "Of margar PDF beiðnir í vinnslu."})
+                else:
+                    self._send(200, pdf, "application/pdf", {"X-Km-Aaetlad": "1" if meta["km_aaetlad"] else "0",
+                                                             "X-Eur-To-Isk": str(meta["eur_to_isk"]),
+                                                             "X-Fx-Source": meta["fx_source"]})
+            else:
+                self._send(404, {"error": "Fannst ekki."})
+        except RequestError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": repr(e)})
+
+
+class QuoteServer(ThreadingHTTPServer):
+    # Sjálfgefin biðröð socketserver (5) hafnar tengingum þegar margir biðlar tengjast í einu
+    request_queue_size = SERVICE_BACKLOG
+    daemon_threads = True
+
+
+def make_server(host=SERVICE_HOST, port=SERVICE_PORT, **service_kwargs):
+    service = QuoteService(**service_kwargs)
+    handler = type("BoundQuoteHandler", (QuoteHandler,), {"service": service})
+    server = QuoteServer((host, port), handler)
+    return server, service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON þjónusta fyrir tilboð og PDF tilboð.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--pdf-workers", type=int, default=SERVICE_PDF_WORKERS, help="0 = PDF í þjónustuferlinu sjálfu")
+    parser.add_argument("--max-pending-pdf", type=int, default=SERVICE_MAX_PENDING_PDF)
+    parser.add_argument("--max-batch", type=int, default=SERVICE_MAX_BATCH)
+    parser.add_argument("--result-store", action="store_true", help="Geyma PDF tilboð á disk")
+    args = parser.parse_args(argv)
+    server, service = make_server(args.host, args.port, pdf_workers=args.pdf_workers,
+                                  max_pending_pdf=args.max_pending_pdf, max_batch=args.max_batch,
+                                  result_store=args.result_store)
+    print(f"Tilboðsþjónusta á http://{args.host}:{server.server_address[1]}", flush=True)
+    # SIGTERM stöðvar þjónustuna eins og Ctrl+C svo PDF ferlin eru lokuð í finally; shutdown() bíður eftir
+    # serve_forever og má því ekki keyra í aðalþræðinum
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Þýdd skyndimynd af gagnaskránum: hver xlsx skrá er lesin einu sinni og vistuð sem dálkar (.npy) og manifest.json
+# í .cache/snapshot/<útgáfa>/, þar sem útgáfan er hash af sniðinu og innihaldi skrárinnar. Ferli varpa fylkjunum
+# inn með mmap_mode="r" svo þau deila síðum stýrikerfisins og ræsast án openpyxl. Breytt xlsx skrá fær nýja útgáfu
+# og er þýdd aftur við næstu hleðslu; eldri útgáfum sömu skrár er þá eytt.
+#
+#   python verkx_snapshot.py             þýðir data/*.xlsx
+#   python verkx_snapshot.py --force     þýðir aftur þó útgáfan sé til
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+import verkx_code as vk
+from verkx_store import FileHasher
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_DIR = os.path.join(os.environ.get("VERKX_CACHE_DIR", ".cache"), "snapshot")
+
+_HASHER = FileHasher()
+_LOADED = {}
+_LOCK = threading.Lock()
+
+
+def _stamp(file_path):
+    st = os.stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def snapshot_version(file_path, kind, options=None):
+    payload = [SNAPSHOT_FORMAT, kind, options, _HASHER.digest(file_path)]
+    return f"{kind}-{hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:20]}"
+
+
+def _write(directory, manifest, arrays):
+    # Skrifað í tímabundna möppu og fært í einu lagi; ef annað ferli varð fyrra til er þess útgáfa notuð
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), values, allow_pickle=False)
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+
+
+def _prune(root, manifest):
+    # Eyðir eldri útgáfum sömu skrár
+    for entry in os.scandir(root):
+        if not entry.is_dir() or entry.name == manifest["version"] or not entry.name.startswith(manifest["kind"] + "-"):
+            continue
+        try:
+            with open(os.path.join(entry.path, "manifest.json"), encoding="utf-8") as f:
+                other = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if other.get("source") == manifest["source"]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def compile_demand(file_path, root=SNAPSHOT_DIR, demand_column='fjoldi eininga'):
+    # Allar raðir skráarinnar í tveimur samfelldum fylkjum (ár, gildi), raðað eftir (blað, landshluti, sviðsmynd, ár).
+    # series.npy heldur (húsnæði, landshluti, sviðsmynd, upphaf, endir) fyrir hverja röð sem vísa í manifest listana.
+    version = snapshot_version(file_path, "demand", demand_column)
+    directory = os.path.join(root, version)
+    housing, housing_keys, labels, scenario_housing = [], [], {}, []
+    regions, scenarios = {}, {}
+    years, values, series = [], [], []
+    start = 0
+    with vk.diag.timer("snapshot.compile"):
+        for name, columns in vk.stream_demand_sheets(file_path, demand_column):
+            housing.append(name)
+            h = len(housing_keys)
+            housing_keys.append(vk.normalize(name))
+            for key, label in columns['labels'].items():
+                labels.setdefault(key, label)
+            if columns['scenario'] is not None:
+                scenario_housing.append(housing_keys[-1])
+            for region, scen, ar, value in vk.sheet_series(columns):
+                r = regions.setdefault(region, len(regions))
+                s = scenarios.setdefault(scen, len(scenarios))
+                years.append(ar)
+                values.append(value)
+                series.append((h, r, s, start, start + len(ar)))
+                start += len(ar)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "kind": "demand",
+        "version": version,
+        "source": os.path.abspath(file_path),
+        "sha256": _HASHER.digest(file_path),
+        "demand_column": demand_column,
+        "housing": housing,
+        "housing_keys": housing_keys,
+        "scenario_housing": scenario_housing,
+        "regions": list(regions),
+        "scenarios": list(scenarios),
+        "labels": labels,
+        "rows": start,
+    }
+    _write(directory, manifest, {
+        "ar": np.concatenate(years) if years else np.empty(0),
+        "value": np.concatenate(values) if values else np.empty(0),
+        "series": np.array(series, dtype=np.int64).reshape(-1, 5),
+    })
+    _prune(root, manifest)
+    return directory
+
+
+def compile_shares(file_path, root=SNAPSHOT_DIR):
+    version = snapshot_version(file_path, "shares")
+    directory = os.path.join(root, version)
+    with vk.diag.timer("snapshot.compile"):
+        share_map = vk.read_share_map(file_path)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "kind": "shares",
+        "version": version,
+        "source": os.path.abspath(file_path),
+        "sha256": _HASHER.digest(file_path),
+        "regions": list(share_map),
+    }
+    _write(directory, manifest, {"share": np.array(list(share_map.values()), dtype=float)})
+    _prune(root, manifest)
+    return directory
+
+
+def _read(directory, names):
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    # np.asarray tekur memmap yfir í venjulegt (skrifvarið) ndarray án afritunar
+    arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")) for name in names}
+    return manifest, arrays
+
+
+class DemandSnapshot:
+    def __init__(self, file_path, directory, stamp):
+        self.file_path = file_path
+        self.directory = directory
+        self.stamp = stamp
+        manifest, arrays = _read(directory, ("ar", "value", "series"))
+        self.manifest = manifest
+        self.housing = manifest["housing"]
+        self.labels = manifest["labels"]
+        self.scenario_housing = manifest["scenario_housing"]
+        ar, value = arrays["ar"], arrays["value"]
+        keys, regions, scenarios = manifest["housing_keys"], manifest["regions"], manifest["scenarios"]
+        self.series = {(keys[h], regions[r], scenarios[s]): (ar[a:b], value[a:b])
+                       for h, r, s, a, b in arrays["series"].tolist()}
+
+
+class ShareSnapshot:
+    def __init__(self, file_path, directory, stamp):
+        self.file_path = file_path
+        self.directory = directory
+        self.stamp = stamp
+        manifest, arrays = _read(directory, ("share",))
+        self.manifest = manifest
+        self.share_map = dict(zip(manifest["regions"], arrays["share"].tolist()))
+
+
+def _load(file_path, kind, root, force=False):
+    key = (os.path.abspath(file_path), kind, os.path.abspath(root))
+    stamp = _stamp(file_path)
+    with _LOCK:
+        loaded = _LOADED.get(key)
+        if loaded is not None and loaded.stamp == stamp and not force:
+            return loaded
+        if kind == "demand":
+            directory = os.path.join(root, snapshot_version(file_path, kind, 'fjoldi eininga'))
+            if force or not os.path.isfile(os.path.join(directory, "manifest.json")):
+                shutil.rmtree(directory, ignore_errors=True)
+                compile_demand(file_path, root)
+            with vk.diag.timer("snapshot.load"):
+                loaded = DemandSnapshot(file_path, directory, stamp)
+        else:
+            directory = os.path.join(root, snapshot_version(file_path, kind))
+            if force or not os.path.isfile(os.path.join(directory, "manifest.json")):
+                shutil.rmtree(directory, ignore_errors=True)
+                compile_shares(file_path, root)
+            with vk.diag.timer("snapshot.load"):
+                loaded = ShareSnapshot(file_path, directory, stamp)
+        _LOADED[key] = loaded
+        return loaded
+
+
+def load_demand(file_path=vk.PAST_FILE, root=SNAPSHOT_DIR, force=False):
+    return _load(file_path, "demand", root, force)
+
+
+def load_shares(file_path=vk.SHARE_FILE, root=SNAPSHOT_DIR, force=False):
+    return _load(file_path, "shares", root, force)
+
+
+def clear_loaded():
+    # Gleymir hlöðnum skyndimyndum í ferlinu; skrárnar á disk standa
+    with _LOCK:
+        _LOADED.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Þýðir xlsx gagnaskrár í minnisvarpaða skyndimynd.")
+    parser.add_argument("--past-file", default=vk.PAST_FILE)
+    parser.add_argument("--future-file", default=vk.FUTURE_FILE)
+    parser.add_argument("--share-file", default=vk.SHARE_FILE)
+    parser.add_argument("--root", default=SNAPSHOT_DIR)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args(argv)
+    for file_path in (args.past_file, args.future_file):
+        snap = load_demand(file_path, args.root, args.force)
+        print(f"{file_path}: {snap.directory} ({snap.manifest['rows']} línur, {len(snap.series)} raðir)")
+    snap = load_shares(args.share_file, args.root, args.force)
+    print(f"{args.share_file}: {snap.directory} ({len(snap.share_map)} landshlutar)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# Varanleg niðurstöðugeymsla (SQLite) fyrir dýr föll eins og main_forecast og main_opperational_forecast.
+# Lykillinn er SHA-256 af heiti fallsins, öllum verkx_*.py skrám og requirements.txt, öllum viðföngum (þ.m.t.
+# seed; fylki og DataFrame eftir innihaldi) og innihaldi gagnaskránna, svo sama beiðni er sótt af disk þvert á ferli og endurræsingar. Niðurstöður eru pickle +
+# zlib; litlar eru geymdar í SQLite, stærri sem skrár við hliðina. Geymslan er takmörkuð við max_bytes
+# og elstu (síðast notuðu) færslunum er hent fyrst.
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+RESULT_STORE_DIR = os.path.join(os.environ.get("VERKX_CACHE_DIR", ".cache"), "results")
+RESULT_STORE_MAX_BYTES = 512 * 1024 * 1024
+RESULT_STORE_INLINE_BYTES = 256 * 1024
+DATA_DIR = "data"
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_FILES = ("requirements.txt",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    fn TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    data BLOB,
+    file TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class FileHasher:
+    # SHA-256 af innihaldi skráa, endurreiknað aðeins þegar (mtime, stærð) breytist
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        key = os.path.abspath(path)
+        with self._lock:
+            found = self._hashes.get(key)
+            if found is not None and found[0] == stamp:
+                return found[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        with self._lock:
+            self._hashes[key] = (stamp, h.hexdigest())
+        return h.hexdigest()
+
+    def directory(self, path, match=None):
+        # match(heiti) -> True takmarkar við ákveðnar skrár
+        if not os.path.isdir(path):
+            return ""
+        parts = sorted((entry.name, self.digest(entry.path)) for entry in os.scandir(path)
+                       if entry.is_file() and (match is None or match(entry.name)))
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def _canonical(value, name):
+    # JSON hæf mynd viðfangs fyrir lykilinn. Fylki og töflur eru táknuð með hash af innihaldinu (repr styttir
+    # þau og ólík gögn fengju sama lykil); önnur gildi sem ekki eiga sér örugga mynd eru ekki geymd.
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v, name) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v, name) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return {"ndarray": "object", "shape": list(value.shape), "values": _canonical(value.tolist(), name)}
+        data = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return {"ndarray": value.dtype.str, "shape": list(value.shape), "sha256": data}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        data = hashlib.sha256(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()).hexdigest()
+        columns = [str(c) for c in value.columns] if isinstance(value, pd.DataFrame) else [str(value.name)]
+        dtypes = [str(t) for t in (value.dtypes if isinstance(value, pd.DataFrame) else [value.dtype])]
+        return {"frame": type(value).__name__, "columns": columns, "dtypes": dtypes, "sha256": data}
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.dtype) or (isinstance(value, type) and issubclass(value, np.generic)):
+        return str(np.dtype(value))
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    raise TypeError(f"Viðfangið '{name}' ({type(value).__name__}) á sér enga örugga mynd í lykli niðurstöðugeymslunnar.")
+
+
+class ResultStore:
+    def __init__(self, directory=RESULT_STORE_DIR, max_bytes=RESULT_STORE_MAX_BYTES, data_dir=DATA_DIR,
+                 inline_bytes=RESULT_STORE_INLINE_BYTES, code_dir=CODE_DIR):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.data_dir = data_dir
+        self.code_dir = code_dir
+        self.inline_bytes = inline_bytes
+        self.hasher = FileHasher()
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.path = os.path.join(directory, "results.sqlite")
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def data_fingerprint(self):
+        # Breytist þegar einhver skrá í data_dir breytist; eldri færslum er þá hent (sjá _check_data)
+        return self.hasher.directory(self.data_dir)
+
+    def code_fingerprint(self):
+        # Allar verkx_*.py einingar og requirements.txt: niðurstaða getur oltið á hvaða þeirra sem er
+        # (t.d. verkx_snapshot, verkx_delivery, verkx_fx), ekki aðeins einingu fallsins
+        return self.hasher.directory(self.code_dir, lambda name: name in CODE_FILES
+                                     or (name.startswith("verkx_") and name.endswith(".py")))
+
+    def _check_data(self, db, fingerprint):
+        row = db.execute("SELECT value FROM meta WHERE name = 'data_fingerprint'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+        with self._lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                stale = db.execute("SELECT key, file FROM entries WHERE fingerprint != ?", (fingerprint,)).fetchall()
+                db.execute("DELETE FROM entries WHERE fingerprint != ?", (fingerprint,))
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('data_fingerprint', ?)", (fingerprint,))
+                self._bump(db, "invalidated", len(stale))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self._remove_files(f for _, f in stale)
+
+    def _remove_files(self, files):
+        for name in files:
+            if name:
+                try:
+                    os.remove(os.path.join(self.directory, "blobs", name))
+                except OSError:
+                    pass
+
+    def _bump(self, db, name, n=1):
+        db.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?", (name, n, n))
+
+    def key(self, fn, args=(), kwargs=None, extra=None):
+        # extra: annað sem niðurstaðan veltur á en er ekki viðfang (t.d. dagsetning í PDF tilboði)
+        bound = inspect.signature(fn).bind(*args, **(kwargs or {}))
+        bound.apply_defaults()
+        arguments = {}
+        for name, value in bound.arguments.items():
+            # Skrár utan data_dir (t.d. gervigögn) bera eigið innihaldshash
+            if isinstance(value, str) and os.path.isfile(value):
+                value = {"file": value, "sha256": self.hasher.digest(value)}
+            arguments[name] = _canonical(value, name)
+        module = inspect.getmodule(fn)
+        source = getattr(module, "__file__", None)
+        payload = {
+            "fn": f"{fn.__module__}.{fn.__qualname__}",
+            "code": [self.hasher.digest(source) if source and os.path.isfile(source) else "", self.code_fingerprint()],
+            "args": arguments,
+            "data": self.data_fingerprint(),
+            "extra": _canonical(extra, "extra"),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        db = self._connect()
+        self._check_data(db, self.data_fingerprint())
+        row = db.execute("SELECT data, file FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            data, file = row
+            try:
+                if file:
+                    with open(os.path.join(self.directory, "blobs", file), "rb") as f:
+                        data = f.read()
+                value = pickle.loads(zlib.decompress(data))
+            except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+        if row is None:
+            self.misses += 1
+            self._bump(db, "misses")
+            return False, None
+        self.hits += 1
+        db.execute("UPDATE entries SET accessed = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        self._bump(db, "hits")
+        return True, value
+
+    def put(self, key, fn_name, value, fingerprint=None):
+        # fingerprint: gögnin sem niðurstaðan var reiknuð úr, ef þau gætu hafa breyst á meðan
+        data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 3)
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        file = None
+        if size > self.inline_bytes:
+            file = f"{key}.bin"
+            tmp = os.path.join(self.directory, "blobs", f"{file}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(self.directory, "blobs", file))
+            data = None
+        now = time.time()
+        db = self._connect()
+        db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                   (key, fn_name, fingerprint or self.data_fingerprint(), now, now, size, data, file))
+        self._bump(db, "stores")
+        self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = []
+        for key, size, file in db.execute("SELECT key, size, file FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            removed.append(file)
+            total -= size
+        self._bump(db, "evictions", len(removed))
+        self._remove_files(removed)
+
+    def call(self, fn, *args, keep=None, **kwargs):
+        # keep(niðurstaða) -> False: niðurstaðan er skilað en ekki geymd
+        fingerprint = self.data_fingerprint()
+        key = self.key(fn, args, kwargs)
+        found, value = self.get(key)
+        if found:
+            return value
+        value = fn(*args, **kwargs)
+        if keep is None or keep(value):
+            self.put(key, f"{fn.__module__}.{fn.__qualname__}", value, fingerprint)
+        return value
+
+    def cached(self, fn, skip=None, keep=None):
+        # skip(bound_arguments) -> True sleppir geymslunni, t.d. þegar seed=None og niðurstaðan er slembin;
+        # keep(niðurstaða) -> False geymir ekki niðurstöðuna, t.d. þegar hún veltur á tímamörkum
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if skip is not None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                if skip(bound.arguments):
+                    return fn(*args, **kwargs)
+            return self.call(fn, *args, keep=keep, **kwargs)
+        return wrapper
+
+    def stats(self):
+        db = self._connect()
+        counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        by_fn = {fn: {"entries": n, "bytes": b, "hits": h}
+                 for fn, n, b, h in db.execute("SELECT fn, COUNT(*), SUM(size), SUM(hits) FROM entries GROUP BY fn")}
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "stores": counters.get("stores", 0),
+            "evictions": counters.get("evictions", 0),
+            "invalidated": counters.get("invalidated", 0),
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+            "functions": by_fn,
+        }
+
+    def clear(self):
+        db = self._connect()
+        files = [f for (f,) in db.execute("SELECT file FROM entries").fetchall()]
+        db.execute("DELETE FROM entries")
+        db.execute("DELETE FROM counters")
+        self._remove_files(files)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_result_store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ResultStore()
+        return _STORE